@@ -0,0 +1,364 @@
+"""Fraud alert dispatcher: email/webhook notifications off the scoring path.
+
+Any scoring path (app.py, scoring_service.py, streaming.py) hands flagged
+decisions to AlertDispatcher.submit(), which only does a dictionary
+lookup and a put_nowait, so scoring never waits on notification I/O:
+
+    submit() --dedup--> bounded queue per channel --worker thread--> channel.send(batch)
+
+- Deduplication: one alert per card (or transaction id when there is no
+  card) within dedup_window seconds.
+- Each channel has its own worker that batches up to max_batch alerts or
+  max_wait seconds, is limited to rate_per_sec deliveries (token bucket),
+  and retries a failed delivery with exponential backoff.
+- A full channel queue drops the alert and counts it instead of blocking.
+
+metrics() reports queue depth, sent/failed/dropped counts and delivery
+latency (submit to delivered) per channel.
+
+Channels are configured from the environment by from_env():
+
+    FRAUD_ALERT_WEBHOOK     URL that receives a JSON list of alerts per POST
+    FRAUD_ALERT_SMTP        host:port of an SMTP relay (one digest email per batch)
+    FRAUD_ALERT_EMAIL_TO    comma-separated recipients
+    FRAUD_ALERT_EMAIL_FROM  sender (default fraud-alerts@localhost)
+    FRAUD_ALERT_JSONL       file that every alert is appended to as one JSON line
+
+Usage:
+    python alerts.py   # delivers synthetic alerts to local SMTP and HTTP stubs and prints metrics
+"""
+
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import urllib.request
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics import LatencyRecorder
+
+# --- Channels ---------------------------------------------------------------
+# A channel only needs send(alerts); it should raise on failure so the worker retries.
+
+
+class WebhookChannel:
+    name = "webhook"
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts):
+        request = urllib.request.Request(self.url, data=json.dumps(alerts).encode(),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SmtpChannel:
+    """One digest email per batch of alerts."""
+
+    name = "email"
+
+    def __init__(self, host, port, recipients, sender="fraud-alerts@localhost", timeout=10.0):
+        self.host = host
+        self.port = port
+        self.recipients = list(recipients)
+        self.sender = sender
+        self.timeout = timeout
+
+    def send(self, alerts):
+        import smtplib
+
+        message = EmailMessage()
+        message["Subject"] = f"Fraud alert: {len(alerts)} suspicious transaction(s)"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content("\n".join(
+            f"transaction {alert.get('id')} card {alert.get('card', '-')}: score {alert['score']:.3f}"
+            for alert in alerts))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+
+class JsonlChannel:
+    """Appends alerts to a JSONL file; handy as an audit log next to the real channels."""
+
+    name = "jsonl"
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alerts):
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(alert) + "\n" for alert in alerts))
+
+
+# --- Dispatcher -------------------------------------------------------------
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+
+    def acquire(self):
+        """Block until one token is available."""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            time.sleep((1 - self._tokens) / self.rate)
+
+
+class ChannelWorker:
+    """Bounded queue plus a thread that batches, rate-limits and retries deliveries for one channel."""
+
+    def __init__(self, channel, queue_size=10_000, max_batch=50, max_wait=1.0, rate_per_sec=None,
+                 max_retries=5, backoff=0.5, max_backoff=30.0):
+        self.channel = channel
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate_per_sec) if rate_per_sec else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency = LatencyRecorder()
+        self.counts = {"sent": 0, "failed": 0, "dropped": 0, "retries": 0, "batches": 0}
+        self._counts_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def offer(self, alert):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            self._count("dropped")
+
+    def _count(self, name, n=1):
+        with self._counts_lock:
+            self.counts[name] += n
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # While stopping, take what is queued without waiting for more
+                if self._stop.is_set() or remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _deliver(self, batch):
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                self.channel.send([alert for alert, _ in batch])
+            except Exception:
+                if attempt == self.max_retries:
+                    self._count("failed", len(batch))
+                    return
+                self._count("retries")
+                time.sleep(min(self.max_backoff, self.backoff * 2 ** attempt))
+                continue
+            delivered = time.monotonic()
+            for _, submitted in batch:
+                self.latency.record(delivered - submitted)
+            self._count("sent", len(batch))
+            self._count("batches")
+            return
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._deliver(batch)
+
+    def stop(self, timeout=None):
+        """Deliver what is queued, then stop the thread."""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def metrics(self):
+        with self._counts_lock:
+            counts = dict(self.counts)
+        return {"queue_depth": self._queue.qsize(), **counts, "delivery": self.latency.summary()}
+
+
+class AlertDispatcher:
+    """Deduplicates flagged decisions and fans them out to the channel workers."""
+
+    def __init__(self, channels, dedup_window=300.0, **worker_options):
+        self.dedup_window = dedup_window
+        self.workers = {getattr(channel, "name", type(channel).__name__): ChannelWorker(channel, **worker_options)
+                        for channel in channels}
+        self.submitted = 0
+        self.duplicates = 0
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self._next_prune = time.monotonic() + dedup_window
+
+    def submit(self, decision):
+        """Queue an alert for every channel; returns False if it was a duplicate. Never blocks."""
+        now = time.monotonic()
+        key = decision.get("card") or decision.get("id")
+        with self._lock:
+            if key is not None:
+                last = self._last_seen.get(key)
+                if last is not None and now - last < self.dedup_window:
+                    self.duplicates += 1
+                    return False
+                self._last_seen[key] = now
+            self.submitted += 1
+            if now >= self._next_prune:
+                self._last_seen = {k: t for k, t in self._last_seen.items() if now - t < self.dedup_window}
+                self._next_prune = now + self.dedup_window
+        alert = dict(decision, alerted_at=time.time())
+        for worker in self.workers.values():
+            worker.offer((alert, now))
+        return True
+
+    def metrics(self):
+        with self._lock:
+            summary = {"submitted": self.submitted, "duplicates": self.duplicates}
+        summary["channels"] = {name: worker.metrics() for name, worker in self.workers.items()}
+        return summary
+
+    def stop(self, timeout=None):
+        for worker in self.workers.values():
+            worker.stop(timeout)
+
+
+def from_env(**options):
+    """An AlertDispatcher for the channels configured in the environment, or None if there are none."""
+    channels = []
+    if os.environ.get("FRAUD_ALERT_WEBHOOK"):
+        channels.append(WebhookChannel(os.environ["FRAUD_ALERT_WEBHOOK"]))
+    if os.environ.get("FRAUD_ALERT_SMTP"):
+        host, _, port = os.environ["FRAUD_ALERT_SMTP"].partition(":")
+        recipients = [r.strip() for r in os.environ.get("FRAUD_ALERT_EMAIL_TO", "").split(",") if r.strip()]
+        if not recipients:
+            raise ValueError("FRAUD_ALERT_SMTP is set but FRAUD_ALERT_EMAIL_TO is empty")
+        channels.append(SmtpChannel(host, int(port or 25), recipients,
+                                    os.environ.get("FRAUD_ALERT_EMAIL_FROM", "fraud-alerts@localhost")))
+    if os.environ.get("FRAUD_ALERT_JSONL"):
+        channels.append(JsonlChannel(os.environ["FRAUD_ALERT_JSONL"]))
+    return AlertDispatcher(channels, **options) if channels else None
+
+
+# --- Local stubs for testing ------------------------------------------------
+
+
+class LocalHttpStub:
+    """Records JSON POSTs; the first fail_first requests get a 503 to exercise retries."""
+
+    def __init__(self, fail_first=0, host="127.0.0.1", port=0):
+        self.received = []
+        self.fail_first = fail_first
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if stub.fail_first > 0:
+                    stub.fail_first -= 1
+                    self.send_response(503)
+                else:
+                    stub.received.append(json.loads(body))
+                    self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}/alerts"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LocalSmtpStub:
+    """Just enough of SMTP for smtplib to deliver; messages end up in .received."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.received = []
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self.wfile.write(b"220 stub ESMTP\r\n")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line[:4].upper()
+                    if command == b"DATA":
+                        self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                        lines = []
+                        for data_line in iter(self.rfile.readline, b""):
+                            if data_line == b".\r\n":
+                                break
+                            lines.append(data_line)
+                        stub.received.append(b"".join(lines).decode())
+                        self.wfile.write(b"250 OK\r\n")
+                    elif command == b"QUIT":
+                        self.wfile.write(b"221 Bye\r\n")
+                        return
+                    else:  # EHLO, HELO, MAIL, RCPT, RSET, NOOP
+                        self.wfile.write(b"250 OK\r\n")
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    import random
+
+    http_stub = LocalHttpStub(fail_first=2)
+    smtp_stub = LocalSmtpStub()
+    dispatcher = AlertDispatcher([WebhookChannel(http_stub.url),
+                                  SmtpChannel(smtp_stub.host, smtp_stub.port, ["analyst@localhost"])],
+                                 dedup_window=60, max_batch=20, max_wait=0.2, rate_per_sec=20, backoff=0.1)
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for i in range(500):
+        dispatcher.submit({"id": i, "card": f"card-{rng.randrange(300)}", "score": rng.uniform(0.5, 1.0),
+                           "label": 1})
+    print(f"500 submits took {(time.perf_counter() - start) * 1000:.1f} ms")
+    dispatcher.stop()
+    print(json.dumps(dispatcher.metrics(), indent=2))
+    print(f"HTTP stub got {sum(len(batch) for batch in http_stub.received)} alerts in "
+          f"{len(http_stub.received)} POSTs; SMTP stub got {len(smtp_stub.received)} emails")
+    http_stub.close()
+    smtp_stub.close()
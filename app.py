@@ -1,28 +1,76 @@
-import streamlit as st
-import joblib
-import numpy as np
-
-# Load the trained model
-model = joblib.load("D://Projects and hackathons//Credit Card Fraud Detection//fraud_detection_model.pkl")
-
-# Streamlit Web App
-st.title("💳 Credit Card Fraud Detection")
-
-st.write("Enter transaction details below:")
-
-# User inputs (create 29 feature inputs)
-features = []
-for i in range(29):
-    value = st.number_input(f"Feature {i+1}", value=0.0)
-    features.append(value)
-
-# Convert input to NumPy array
-features = np.array(features).reshape(1, -1)
-
-# Predict button
-if st.button("Check for Fraud"):
-    prediction = model.predict(features)[0]
-    if prediction == 1:
-        st.error("🚨 Fraudulent Transaction Detected!")
-    else:
-        st.success("✅ Transaction is Safe.")
\ No newline at end of file
+import json
+import os
+import time
+import urllib.request
+
+import streamlit as st
+import numpy as np
+
+from alerts import from_env
+from model_loader import load_model, load_stats
+
+# With a worker pool running (worker_pool.py), score through it instead of loading a model copy here
+SCORING_URL = os.environ.get("FRAUD_SCORING_URL")
+
+
+# Load the trained model once per server process, not on every rerun
+@st.cache_resource
+def get_model():
+    return None if SCORING_URL else load_model()
+
+
+# Alert channels come from FRAUD_ALERT_* environment variables (see alerts.py); None if unset
+@st.cache_resource
+def get_alerts():
+    return from_env()
+
+
+def remote_score(features):
+    """Score through the pool; it also sends the alert for a flagged transaction."""
+    body = json.dumps({"transactions": features.tolist()}).encode()
+    request = urllib.request.Request(SCORING_URL.rstrip("/") + "/score", data=body,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())["scores"][0]
+
+
+model = get_model()
+alerts = None if SCORING_URL else get_alerts()
+
+# Streamlit Web App
+st.title("💳 Credit Card Fraud Detection")
+
+st.write("Enter transaction details below:")
+
+# User inputs (create 29 feature inputs)
+features = []
+for i in range(29):
+    value = st.number_input(f"Feature {i+1}", value=0.0)
+    features.append(value)
+
+# Convert input to NumPy array
+features = np.array(features).reshape(1, -1)
+
+# Predict button
+if st.button("Check for Fraud"):
+    start = time.perf_counter()
+    score = remote_score(features) if SCORING_URL else float(model.predict_proba(features)[0, 1])
+    prediction = int(score > 0.5)
+    predict_ms = (time.perf_counter() - start) * 1000
+    if prediction == 1:
+        st.error("🚨 Fraudulent Transaction Detected!")
+        if alerts is not None:
+            # Only queued here; delivery runs on the dispatcher's threads
+            alerts.submit({"score": score, "label": 1, "features": features[0].tolist()})
+    else:
+        st.success("✅ Transaction is Safe.")
+    st.caption(f"Prediction took {predict_ms:.1f} ms" + (f" via {SCORING_URL}" if SCORING_URL else ""))
+
+# Model load time (only paid once per server process)
+stats = None if SCORING_URL else load_stats()
+if stats:
+    st.sidebar.caption(f"Model loaded in {stats['load_seconds'] * 1000:.0f} ms (version {stats['version']})")
+if hasattr(model, "escalation_stats"):  # a cascade.CascadeModel artifact
+    cascade_stats = model.escalation_stats()
+    st.sidebar.caption(f"Cascade: {cascade_stats['escalation_rate']:.1%} of {cascade_stats['rows']} transactions "
+                       "needed the full model")
@@ -0,0 +1,231 @@
+"""Batch scoring for large transaction files.
+
+Scores CSV or Parquet files with the stacked model saved by
+credit_card_fraud_detection.py. The input is read in fixed-size chunks,
+predict_proba is called once per chunk and the scores are streamed back
+out, so memory stays bounded no matter how big the file is.
+
+Usage:
+    python batch_score.py transactions.csv scored.csv --chunk-size 100000 --workers 4
+
+The input must contain the 29 model features (V1..V28, Amount) with
+Amount already standardized the same way as during training. Any other
+columns (Time, Class, ids...) are carried through to the output unless
+--scores-only is given.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from model_loader import FEATURE_COLUMNS, load_model
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Model used by the worker processes (loaded once per worker)
+_worker_model = None
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def iter_chunks(path, chunk_size, dtype=None):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet file (dtype: read_csv overrides)."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=dtype)
+
+
+def passthrough_dtypes(path, chunk_size):
+    """dtypes of a CSV's non-feature columns as inferred from the whole file.
+
+    read_csv(chunksize=...) infers every chunk on its own: an id column is
+    int64 in one chunk and float64 in the next if it has a gap there, and
+    a text column that is empty in a chunk comes out as float64. One pass
+    over just these columns settles a single dtype per column: numeric
+    dtypes are widened, anything mixed with text becomes object.
+    """
+    columns = [col for col in pd.read_csv(path, nrows=0).columns if col not in FEATURE_COLUMNS]
+    dtypes = {}
+    if not columns:
+        return dtypes
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+        for col in columns:
+            values = chunk[col]
+            if values.isna().all():  # says nothing about the column's type
+                continue
+            previous = dtypes.get(col, values.dtype)
+            if previous.kind in "iuf" and values.dtype.kind in "iuf":
+                dtypes[col] = np.result_type(previous, values.dtype)
+            elif previous != values.dtype:
+                dtypes[col] = np.dtype(object)
+            else:
+                dtypes[col] = previous
+    return dtypes
+
+
+def score_frame(model, frame, threshold=0.5):
+    """Return (scores, labels) for one chunk, using a single predict_proba call."""
+    missing = [col for col in FEATURE_COLUMNS if col not in frame.columns]
+    if missing:
+        raise ValueError(f"Input is missing model features: {missing}")
+
+    scores = model.predict_proba(frame[FEATURE_COLUMNS])[:, 1]
+    labels = (scores > threshold).astype(np.int8)
+    return scores, labels
+
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = load_model(model_path)
+
+
+def _score_in_worker(frame, threshold):
+    return score_frame(_worker_model, frame, threshold)
+
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or Parquet file as they arrive.
+
+    Chunks go to <path>.tmp, which close() moves to path only if the run
+    succeeded, so a failed run never leaves a truncated output behind.
+    Parquet needs one schema for the whole file: it is taken from the
+    first chunk and every later chunk is converted to it (score_file reads
+    CSV input with passthrough_dtypes() so the chunks agree).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp_path = path + ".tmp"
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, frame):
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._parquet_writer is None:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                self._parquet_writer = pq.ParquetWriter(self._tmp_path, table.schema)
+            else:
+                try:
+                    table = pa.Table.from_pandas(frame, schema=self._parquet_writer.schema, preserve_index=False)
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    raise ValueError(f"A chunk doesn't fit the column types of the first chunk ({e}); "
+                                     "use a larger --chunk-size or a CSV output") from e
+            self._parquet_writer.write_table(table)
+        else:
+            frame.to_csv(self._tmp_path, mode="a" if self._wrote_header else "w",
+                         header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self, success=True):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if not os.path.exists(self._tmp_path):
+            return
+        if success:
+            os.replace(self._tmp_path, self.path)
+        else:
+            os.remove(self._tmp_path)
+
+
+def _build_output(frame, scores, labels, scores_only):
+    out = pd.DataFrame(index=frame.index) if scores_only else frame.copy()
+    out["fraud_score"] = scores
+    out["fraud_label"] = labels
+    return out
+
+
+def score_file(input_path, output_path, model_path=None,
+               chunk_size=DEFAULT_CHUNK_SIZE, workers=1, threshold=0.5,
+               scores_only=False, log=print):
+    """Score input_path chunk by chunk and write the results to output_path.
+
+    With workers > 1 the chunks are fanned out to a process pool. At most
+    2 * workers chunks are in flight at once, which keeps memory bounded,
+    and results are written in input order. Chunks are scored with the
+    pickled model: at these batch sizes XGBoost's own predictor is faster
+    than the NumPy-only model from compiled_model.py.
+
+    Returns a dict with the number of rows, elapsed seconds and rows/sec.
+    """
+    start = time.perf_counter()
+    total_rows = 0
+    writer = ChunkWriter(output_path)
+    success = False
+    # A Parquet output has one schema, so CSV chunks must agree on their column types
+    dtype = (passthrough_dtypes(input_path, chunk_size)
+             if _is_parquet(output_path) and not _is_parquet(input_path) and not scores_only else None)
+
+    def report(n_rows):
+        elapsed = time.perf_counter() - start
+        log(f"Scored {n_rows:,} rows in {elapsed:.1f}s ({n_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+    try:
+        if workers <= 1:
+            model = load_model(model_path)
+            for frame in iter_chunks(input_path, chunk_size, dtype):
+                scores, labels = score_frame(model, frame, threshold)
+                writer.write(_build_output(frame, scores, labels, scores_only))
+                total_rows += len(frame)
+                report(total_rows)
+        else:
+            import multiprocessing
+
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+                pending = deque()
+                for frame in iter_chunks(input_path, chunk_size, dtype):
+                    pending.append((frame, pool.apply_async(_score_in_worker, (frame, threshold))))
+                    # Keep only a few chunks in memory at a time
+                    while len(pending) >= 2 * workers:
+                        frame_done, result = pending.popleft()
+                        scores, labels = result.get()
+                        writer.write(_build_output(frame_done, scores, labels, scores_only))
+                        total_rows += len(frame_done)
+                        report(total_rows)
+                while pending:
+                    frame_done, result = pending.popleft()
+                    scores, labels = result.get()
+                    writer.write(_build_output(frame_done, scores, labels, scores_only))
+                    total_rows += len(frame_done)
+                    report(total_rows)
+        success = True
+    finally:
+        writer.close(success)
+
+    elapsed = time.perf_counter() - start
+    return {"rows": total_rows, "seconds": elapsed, "rows_per_sec": total_rows / max(elapsed, 1e-9)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a transaction file with the fraud detection model.")
+    parser.add_argument("input", help="CSV or Parquet file with the 29 model features")
+    parser.add_argument("output", help="CSV or Parquet file to write scores to")
+    parser.add_argument("--model", default=None, help="Path to the saved model (default: $FRAUD_MODEL_PATH)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per predict_proba call")
+    parser.add_argument("--workers", type=int, default=1, help="Number of scoring processes")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Score above which a transaction is flagged")
+    parser.add_argument("--scores-only", action="store_true", help="Only write fraud_score and fraud_label")
+    args = parser.parse_args(argv)
+
+    stats = score_file(args.input, args.output, model_path=args.model, chunk_size=args.chunk_size,
+                       workers=args.workers, threshold=args.threshold, scores_only=args.scores_only,
+                       log=lambda msg: print(msg, file=sys.stderr))
+    print(f"Done: {stats['rows']:,} rows, {stats['rows_per_sec']:,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Inference and training benchmarks with regression tracking.
+
+Measures, for the shipped fraud_detection_model.pkl:
+
+    load_seconds            cold model load in a fresh interpreter (imports included)
+    single_row_p50_ms/p99   model.predict_proba on one row, the way app.py calls it
+    batch_<n>_rows_per_sec  predict_proba throughput at several batch sizes
+    compiled_*              the same for compiled_model.py, if the .npz exists
+    explain_*               uncached top-k explanation latency and throughput (explanations.py)
+    peak_rss_mb             peak RSS of the benchmark process
+
+and the wall time of every training_pipeline stage on synthetic data with
+the creditcard.csv schema (train_<stage>_seconds). Everything runs
+offline on generated data.
+
+The inference measurements are repeated --rounds times and the median
+round is kept, so one round slowed by (or sped up by a turbo burst on)
+the rest of the machine doesn't move the result. Results are written as JSON
+and compared against a stored baseline; any gated metric more than
+--tolerance worse than the baseline is reported and the exit code is 1,
+so the check can gate a deploy. Only stable metrics are gated (p50
+latencies, throughputs, load time and peak RSS); p99 latencies, the
+cached-explanation lookup and the single-run training stage times are
+reported but not gated. Single-row and 10-row calls take well under a
+millisecond, so scheduler noise moves them more; they are allowed twice
+the tolerance.
+
+Usage:
+    python benchmark.py --save-baseline          # on the reference machine
+    python benchmark.py                          # compare against benchmark_baseline.json
+    python benchmark.py --skip-training --output results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from model_loader import FEATURE_COLUMNS, load_model, resolve_model_path
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_OUTPUT = "benchmark_results.json"
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+# Metrics where a larger value is better; all others are times or sizes
+HIGHER_IS_BETTER_SUFFIX = "_rows_per_sec"
+# Reported only: tail latencies and sub-millisecond lookups swing with noise, training stages run once
+UNGATED_SUFFIXES = ("_p99_ms", "explain_cached_row_ms")
+UNGATED_PREFIX = "train_"
+# Sub-millisecond calls: allowed NOISY_FACTOR times the tolerance
+NOISY_PATTERN = re.compile(r"single_row_p50_ms|batch_(1|10)_rows_per_sec")
+NOISY_FACTOR = 2
+
+
+def synthetic_transactions(n_rows, fraud_rate=0.0017, seed=42):
+    """A DataFrame with the creditcard.csv columns (Time, V1..V28, Amount, Class)."""
+    rng = np.random.default_rng(seed)
+    y = (rng.random(n_rows) < fraud_rate).astype(np.int64)
+    y[:max(10, int(n_rows * fraud_rate))] = 1  # enough frauds for SMOTE and stratified splits
+    rng.shuffle(y)
+    data = {"Time": np.sort(rng.integers(0, 172_800, n_rows)).astype(np.float64)}
+    shift = rng.normal(scale=2.0, size=28)  # frauds differ from legit transactions on every component
+    for i in range(28):
+        data[f"V{i + 1}"] = rng.normal(size=n_rows) + y * shift[i]
+    data["Amount"] = np.round(rng.exponential(88.0, n_rows), 2)
+    data["Class"] = y
+    return pd.DataFrame(data)
+
+
+def _timed_calls(func, repeats):
+    times = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        func()
+        times[i] = time.perf_counter() - start
+    return times
+
+
+def cold_load_seconds(model_path):
+    """Load the model in a fresh interpreter, so import cost is included."""
+    code = ("import time; start = time.perf_counter(); import model_loader; "
+            f"model_loader.load_model({model_path!r}); print(time.perf_counter() - start)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark_scorer(prefix, scorer, X, single_repeats=200):
+    metrics = {}
+    row = X[:1]
+    scorer.predict_proba(row)  # warm-up
+    times = _timed_calls(lambda: scorer.predict_proba(row), single_repeats)
+    metrics[f"{prefix}single_row_p50_ms"] = float(np.percentile(times, 50) * 1000)
+    metrics[f"{prefix}single_row_p99_ms"] = float(np.percentile(times, 99) * 1000)
+    for batch_size in BATCH_SIZES:
+        batch = X[:batch_size]
+        repeats = max(3, min(200, 20_000 // batch_size))
+        times = _timed_calls(lambda: scorer.predict_proba(batch), repeats)
+        metrics[f"{prefix}batch_{batch_size}_rows_per_sec"] = float(batch_size / np.median(times))
+    return metrics
+
+
+def benchmark_inference(model_path=None, rounds=5):
+    """Every inference metric measured `rounds` times; the median round of each is kept."""
+    from compiled_model import CompiledModel, compiled_path_for
+    from explanations import Explainer, benchmark_explainer
+
+    model_path = resolve_model_path(model_path)
+    X = np.random.default_rng(0).normal(size=(max(BATCH_SIZES), len(FEATURE_COLUMNS)))
+    model = load_model(model_path)
+    explainer = Explainer(model)
+    compiled_path = compiled_path_for(model_path)
+    compiled = CompiledModel.load(compiled_path) if os.path.exists(compiled_path) else None
+
+    measured = []
+    for _ in range(rounds):
+        metrics = {"load_seconds": cold_load_seconds(model_path)}
+        with warnings.catch_warnings():
+            # app.py passes a plain array to a model fit on a DataFrame
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            metrics.update(benchmark_scorer("", model, X))
+            metrics.update(benchmark_explainer(explainer, X))
+        if compiled is not None:
+            metrics.update(benchmark_scorer("compiled_", compiled, X))
+        measured.append(metrics)
+    return {name: float(np.median([metrics[name] for metrics in measured])) for name in measured[0]}
+
+
+def benchmark_training(n_rows=20_000):
+    """Per-stage wall time of training_pipeline on synthetic data, with a reduced search."""
+    from training_pipeline import run_pipeline
+
+    config = {
+        "fit": {"rf_n_estimators": 50},
+        "tune": {"n_iter": 2, "cv": 2, "n_jobs": 1},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "synthetic.csv")
+        synthetic_transactions(n_rows).to_csv(csv_path, index=False)
+        config["export"] = {"path": os.path.join(tmp, "model.pkl"), "write_manifest": False}
+        previous_cache = os.environ.get("FRAUD_DATA_CACHE")
+        os.environ["FRAUD_DATA_CACHE"] = os.path.join(tmp, "data_cache")
+        try:
+            records = run_pipeline(csv_path, config, cache_dir=os.path.join(tmp, "pipeline_cache"))
+        finally:
+            if previous_cache is None:
+                os.environ.pop("FRAUD_DATA_CACHE")
+            else:
+                os.environ["FRAUD_DATA_CACHE"] = previous_cache
+    return {f"train_{record['stage']}_seconds": record["seconds"] for record in records}
+
+
+def is_gated(name):
+    return not (name.endswith(UNGATED_SUFFIXES) or name.startswith(UNGATED_PREFIX))
+
+
+def metric_tolerance(name, tolerance):
+    return tolerance * NOISY_FACTOR if NOISY_PATTERN.search(name) else tolerance
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of (metric, baseline, current) for gated metrics that got worse than their tolerance allows."""
+    regressions = []
+    for name, base_value in baseline["metrics"].items():
+        current = results["metrics"].get(name)
+        if current is None or base_value <= 0 or not is_gated(name):
+            continue
+        allowed = metric_tolerance(name, tolerance)
+        if name.endswith(HIGHER_IS_BETTER_SUFFIX):
+            worse = current < base_value * (1 - allowed)
+        else:
+            worse = current > base_value * (1 + allowed)
+        if worse:
+            regressions.append((name, base_value, current))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark model inference and training.")
+    parser.add_argument("--model", default=None, help="Path to the saved model (default: $FRAUD_MODEL_PATH)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Stored baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown (0.2 = 20%%)")
+    parser.add_argument("--rounds", type=int, default=5, help="Inference measurements to take the best of")
+    parser.add_argument("--skip-training", action="store_true", help="Only benchmark inference")
+    parser.add_argument("--train-rows", type=int, default=20_000, help="Rows of synthetic training data")
+    args = parser.parse_args(argv)
+
+    metrics = benchmark_inference(args.model, args.rounds)
+    if not args.skip_training:
+        metrics.update(benchmark_training(args.train_rows))
+    metrics["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    results = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "metrics": {name: round(value, 4) for name, value in metrics.items()},
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for name, value in results["metrics"].items():
+        print(f"{name:<40}{value:>14,.4f}{'' if is_gated(name) else '  (not gated)'}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, base_value, current in regressions:
+        print(f"REGRESSION {name}: {base_value:,.4f} -> {current:,.4f}")
+    if not regressions:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Two-stage cascade: a linear pre-screen in front of the stacked model.
+
+Almost every transaction is legitimate, and most of them are obviously
+so. The cascade scores every row with a Logistic Regression screen (a
+dot product and a sigmoid, evaluated with NumPy) and sends only the rows
+scoring at or above `cutoff` to the full XGBoost + LR stack. Rows below
+the cutoff keep the screen's score, which is under the alert threshold,
+so they are never flagged. The screen is fit on standardized features;
+the scaler is folded into its coefficients, so scoring stays one dot
+product on the raw feature row.
+
+The cutoff is calibrated offline by calibrate_cutoff(): among the
+held-out frauds the full model catches, at most max_recall_loss (as a
+share of all frauds) may fall below it. Everything the cascade misses is
+therefore a fraud the full model would have caught and the screen
+cleared, so the cascade's recall is the full model's recall minus at
+most max_recall_loss on the calibration data.
+
+CascadeModel has predict_proba(), so scoring_service.py, worker_pool.py
+and app.py serve it like the plain model (point --model or
+FRAUD_MODEL_PATH at fraud_detection_cascade.pkl, written by the
+pipeline's cascade stage). escalation_stats() reports how many rows
+reached the full model; the service includes it in /metrics.
+
+Usage:
+    python training_pipeline.py creditcard.csv --config cascade.json   # {"cascade": {"enabled": true}}
+    python cascade.py --model fraud_detection_cascade.pkl               # latency and escalation on synthetic rows
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class CascadeModel:
+    """A fitted LogisticRegression screen in front of a fitted full model.
+
+    If the screen was fit on scaler.transform(X), pass the fitted
+    StandardScaler as scaler; it is folded into coef and intercept.
+    """
+
+    def __init__(self, screen, full_model, cutoff, threshold=0.5, scaler=None):
+        from resampling import unwrap_estimator
+
+        if cutoff > threshold:
+            raise ValueError(f"cutoff {cutoff} is above the alert threshold {threshold}; "
+                             "cleared rows would be flagged")
+        screen = unwrap_estimator(screen)
+        self.coef = np.asarray(screen.coef_, dtype=np.float64).ravel()
+        self.intercept = float(np.ravel(screen.intercept_)[0])
+        if scaler is not None:
+            # w . (x - mean) / scale + b == (w / scale) . x + (b - (w / scale) . mean)
+            self.coef = self.coef / scaler.scale_
+            self.intercept -= float(self.coef @ scaler.mean_)
+        self.full_model = full_model
+        self.cutoff = float(cutoff)
+        self.threshold = threshold
+        self.classes_ = np.array([0, 1])
+        if hasattr(full_model, "feature_names_in_"):
+            self.feature_names_in_ = full_model.feature_names_in_
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.rows = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_counters()
+
+    def screen_scores(self, X):
+        return _sigmoid(np.asarray(X, dtype=np.float64) @ self.coef + self.intercept)
+
+    def predict_proba(self, X):
+        scores = self.screen_scores(X)
+        escalate = np.flatnonzero(scores >= self.cutoff)
+        if len(escalate):
+            rows = X.iloc[escalate] if hasattr(X, "iloc") else np.asarray(X)[escalate]
+            scores[escalate] = self.full_model.predict_proba(rows)[:, 1]
+        with self._lock:
+            self.rows += len(scores)
+            self.escalated += len(escalate)
+        return np.column_stack([1.0 - scores, scores])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > self.threshold).astype(int)
+
+    def escalation_stats(self):
+        with self._lock:
+            return {"rows": self.rows, "escalated": self.escalated, "cutoff": self.cutoff,
+                    "escalation_rate": round(self.escalated / self.rows, 6) if self.rows else 0.0}
+
+
+def calibrate_cutoff(screen_scores, full_scores, y, max_recall_loss=0.01, threshold=0.5):
+    """Highest cutoff (at most threshold) that clears at most max_recall_loss of all frauds
+    that the full model flags."""
+    y = np.asarray(y)
+    n_fraud = int((y == 1).sum())
+    caught = np.sort(np.asarray(screen_scores)[(y == 1) & (np.asarray(full_scores) > threshold)])
+    allowed = int(np.floor(max_recall_loss * n_fraud + 1e-9))
+    # Rows scoring >= caught[allowed] are escalated, so only caught[:allowed] can be cleared
+    return float(min(caught[allowed], threshold)) if allowed < len(caught) else float(threshold)
+
+
+def evaluate_cascade(cascade, X, y):
+    """Recall of the full model and the cascade at the threshold, and the escalation rate, on X."""
+    y = np.asarray(y)
+    full = cascade.full_model.predict_proba(X)[:, 1] > cascade.threshold
+    screen = cascade.screen_scores(X)
+    escalated = screen >= cascade.cutoff
+    fraud = y == 1
+    n_fraud = max(int(fraud.sum()), 1)
+    full_recall = float((full & fraud).sum() / n_fraud)
+    cascade_recall = float((full & escalated & fraud).sum() / n_fraud)
+    return {"rows": len(y), "frauds": int(fraud.sum()), "escalation_rate": float(escalated.mean()),
+            "fraud_escalation_rate": float(escalated[fraud].mean()) if fraud.any() else 0.0,
+            "full_recall": full_recall, "cascade_recall": cascade_recall,
+            "recall_loss": full_recall - cascade_recall}
+
+
+def compare_cost(cascade, X, single_rows=200):
+    """Wall time per single-row call and CPU time per row in one batch call, full model vs cascade."""
+    X = np.asarray(X, dtype=np.float64)
+    metrics = {}
+    for name, model in (("full", cascade.full_model), ("cascade", cascade)):
+        rows = X[:single_rows]
+        start = time.perf_counter()
+        for row in rows:
+            model.predict_proba(row[None, :])
+        metrics[f"{name}_single_row_ms"] = (time.perf_counter() - start) / len(rows) * 1000
+        start = time.process_time()
+        model.predict_proba(X)
+        metrics[f"{name}_batch_cpu_us_per_row"] = (time.process_time() - start) / len(X) * 1e6
+    return metrics
+
+
+def format_report(metrics):
+    return "\n".join(f"{name:<32}{value:>12,}" if isinstance(value, int) else f"{name:<32}{value:>12,.4f}"
+                     for name, value in metrics.items())
+
+
+if __name__ == "__main__":
+    import argparse
+    import warnings
+
+    from model_loader import FEATURE_COLUMNS, load_model
+
+    parser = argparse.ArgumentParser(description="Time a saved cascade against its full model.")
+    parser.add_argument("--model", default="fraud_detection_cascade.pkl", help="Cascade written by the pipeline")
+    parser.add_argument("--rows", type=int, default=20_000, help="Synthetic rows to score")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    cascade = load_model(args.model)
+    # Standard-normal rows look like the scaled PCA features of ordinary transactions
+    X = np.random.default_rng(0).normal(size=(args.rows, len(FEATURE_COLUMNS)))
+    metrics = compare_cost(cascade, X)
+    metrics["escalation_rate"] = float((cascade.screen_scores(X) >= cascade.cutoff).mean())
+    print(format_report(metrics))
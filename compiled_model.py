@@ -0,0 +1,210 @@
+"""Pure-NumPy inference for the stacked XGBoost + Logistic Regression model.
+
+export_compiled() flattens the saved StackingClassifier into plain arrays:
+one node table holding every tree of the XGBoost base learner, plus the
+coefficients of the Logistic Regression meta-learner. CompiledModel
+evaluates them with vectorized NumPy only, so scoring processes don't
+import sklearn or xgboost and skip their per-call validation and DMatrix
+construction, which dominates the cost of single rows and small batches.
+
+That is the only regime where it wins: from a few hundred rows per call
+XGBoost's C++ predictor is faster, so the compiled model is offered for
+the per-request paths (scoring_service.py, worker_pool.py) and not for
+batch_score.py or streaming.py.
+
+Usage:
+    python compiled_model.py   # writes fraud_detection_model.npz next to the model and checks it
+"""
+
+import json
+import os
+
+import numpy as np
+
+COMPILED_SUFFIX = ".npz"
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def _unwrap(estimator):
+    # resampling.OnTheFlySMOTEClassifier keeps the fitted model in estimator_
+    return getattr(estimator, "estimator_", estimator)
+
+
+def compile_model(stacked_model):
+    """Return a dict of flat arrays equivalent to a fitted StackingClassifier(XGB) + LR meta-learner."""
+    if len(stacked_model.estimators_) != 1 or stacked_model.stack_method_ != ["predict_proba"]:
+        raise ValueError("Only a single XGBClassifier base learner stacked on predict_proba is supported")
+    booster = _unwrap(stacked_model.estimators_[0]).get_booster()
+    dump = json.loads(booster.save_raw(raw_format="json"))
+    learner = dump["learner"]
+    if learner["objective"]["name"] != "binary:logistic":
+        raise ValueError(f"Unsupported objective {learner['objective']['name']}")
+
+    feature, threshold, left, right, default_left, value, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+    for tree in learner["gradient_booster"]["model"]["trees"]:
+        tree_left = np.asarray(tree["left_children"], dtype=np.int32)
+        tree_right = np.asarray(tree["right_children"], dtype=np.int32)
+        n_nodes = len(tree_left)
+        node_ids = np.arange(n_nodes, dtype=np.int32)
+        is_leaf = tree_left == -1
+
+        # Leaves point to themselves so every row can take the same number of steps
+        left.append(np.where(is_leaf, node_ids, tree_left) + offset)
+        right.append(np.where(is_leaf, node_ids, tree_right) + offset)
+        feature.append(np.where(is_leaf, 0, tree["split_indices"]).astype(np.int32))
+        # XGBoost stores the leaf value in split_conditions for leaf nodes
+        threshold.append(np.where(is_leaf, np.inf, tree["split_conditions"]).astype(np.float32))
+        value.append(np.where(is_leaf, tree["split_conditions"], 0.0).astype(np.float32))
+        default_left.append(np.asarray(tree["default_left"], dtype=bool))
+        roots.append(offset)
+
+        depth = np.zeros(n_nodes, dtype=np.int32)
+        for node in range(n_nodes):  # parents always come before their children
+            if not is_leaf[node]:
+                depth[tree_left[node]] = depth[tree_right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+        offset += n_nodes
+
+    base_score = float(learner["learner_model_param"]["base_score"])
+    meta = _unwrap(stacked_model.final_estimator_)
+    return {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "default_left": np.concatenate(default_left),
+        "value": np.concatenate(value),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": np.int32(max_depth),
+        "base_margin": np.float64(np.log(base_score / (1.0 - base_score))),
+        "meta_coef": np.asarray(meta.coef_, dtype=np.float64).ravel(),
+        "meta_intercept": np.float64(meta.intercept_[0]),
+        "passthrough": np.bool_(stacked_model.passthrough),
+        "feature_names": np.asarray(getattr(stacked_model, "feature_names_in_", []), dtype=str),
+    }
+
+
+def export_compiled(stacked_model, path, source_path=None):
+    """Compile stacked_model and save the arrays to an .npz file.
+
+    source_path is the pickled artifact the model was loaded from; its
+    checksum is stored so load_compiled_model() can refuse a stale .npz.
+    """
+    from model_loader import file_sha256
+
+    arrays = compile_model(stacked_model)
+    if source_path is not None:
+        arrays["source_sha256"] = np.asarray(file_sha256(source_path))
+    np.savez(path, **arrays)
+    return path
+
+
+class CompiledModel:
+    """Scores transactions with the arrays written by export_compiled()."""
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.default_left = arrays["default_left"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.base_margin = float(arrays["base_margin"])
+        self.meta_coef = arrays["meta_coef"]
+        self.meta_intercept = float(arrays["meta_intercept"])
+        self.passthrough = bool(arrays["passthrough"])
+        self.feature_names = [str(name) for name in arrays["feature_names"]]
+        self.source_sha256 = str(arrays["source_sha256"]) if "source_sha256" in arrays else None
+        # Node n's children at 2n (left) and 2n + 1 (right): one lookup per step instead of two
+        self.children = np.column_stack([self.left, self.right]).ravel()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls({name: arrays[name] for name in arrays.files})
+
+    def xgb_margin(self, X, block_size=256):
+        """Raw XGBoost margin (log-odds) for each row of X.
+
+        Rows go through the trees block_size at a time, so the per-step
+        (rows x trees) index arrays stay in cache.
+        """
+        # XGBoost compares features and thresholds in float32
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X32.shape
+        has_missing = np.isnan(X32).any()
+        margin = np.empty(n_rows)
+        for start in range(0, n_rows, block_size):
+            block = X32[start:start + block_size]
+            flat = block.ravel()
+            row_offsets = (np.arange(len(block), dtype=np.int32) * n_features)[:, None]
+            nodes = np.broadcast_to(self.roots, (len(block), self.roots.size))
+            for _ in range(self.max_depth):
+                values = flat[row_offsets + self.feature[nodes]]
+                go_right = ~(values < self.threshold[nodes])
+                if has_missing:
+                    go_right &= ~(np.isnan(values) & self.default_left[nodes])
+                nodes = self.children[2 * nodes + go_right]
+            margin[start:start + block_size] = self.value[nodes].sum(axis=1, dtype=np.float64)
+        return margin + self.base_margin
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        xgb_proba = _sigmoid(self.xgb_margin(X))
+        z = xgb_proba * self.meta_coef[0] + self.meta_intercept
+        if self.passthrough:
+            z = z + X @ self.meta_coef[1:]
+        proba = _sigmoid(z)
+        return np.column_stack([1.0 - proba, proba])
+
+    def predict(self, X, threshold=0.5):
+        return (self.predict_proba(X)[:, 1] > threshold).astype(np.int64)
+
+
+def compiled_path_for(model_path):
+    return os.path.splitext(model_path)[0] + COMPILED_SUFFIX
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from model_loader import load_model, resolve_model_path
+
+    parser = argparse.ArgumentParser(description="Compile the stacked model to NumPy arrays.")
+    parser.add_argument("--model", default=None, help="Path to the saved model (default: $FRAUD_MODEL_PATH)")
+    parser.add_argument("--output", default=None, help="Where to write the .npz (default: next to the model)")
+    args = parser.parse_args()
+
+    model_path = resolve_model_path(args.model)
+    output = args.output or compiled_path_for(model_path)
+    stacked_model = load_model(model_path)
+    export_compiled(stacked_model, output, source_path=model_path)
+    compiled = CompiledModel.load(output)
+
+    # Check against the original model
+    X = np.random.default_rng(42).normal(scale=3, size=(20_000, len(compiled.feature_names)))
+    diff = np.abs(compiled.predict_proba(X)[:, 1] - stacked_model.predict_proba(X)[:, 1]).max()
+    print(f"Wrote {output}; max probability difference: {diff:.2e}")
+
+    # The meta-learner rejects NaN, but the trees' missing-value routing should still match
+    X_missing = X.copy()
+    X_missing[::7, 13] = np.nan
+    xgb_margin = _unwrap(stacked_model.estimators_[0]).predict(X_missing, output_margin=True)
+    print(f"Max XGBoost margin difference with missing values: "
+          f"{np.abs(compiled.xgb_margin(X_missing) - xgb_margin).max():.2e}")
+
+    for name, scorer in [("sklearn", stacked_model), ("compiled", compiled)]:
+        start = time.perf_counter()
+        for i in range(200):
+            scorer.predict_proba(X[i:i + 1])
+        print(f"{name}: {(time.perf_counter() - start) / 200 * 1e6:.0f} us per single row")
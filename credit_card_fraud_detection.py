@@ -32,8 +32,9 @@ from imblearn.over_sampling import SMOTE
 
 """# **Reading the Data**"""
 
-# Load the Dataset
-df = pd.read_csv('/content/drive/MyDrive/Data for projects/creditcard.csv')
+# Load the Dataset (parsed once into a typed columnar cache, memory-mapped on later runs)
+from data_cache import load_dataset
+df = load_dataset('/content/drive/MyDrive/Data for projects/creditcard.csv')
 
 print(df.head()) # Display First few rows
 
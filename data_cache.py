@@ -0,0 +1,246 @@
+"""Columnar cache for the transaction dataset.
+
+The raw creditcard.csv is parsed once and stored as one .npy file per
+column, in a directory keyed by the SHA-256 of the CSV contents. Columns
+are stored as the smallest integer type when every value is whole
+(Class, Time), as float32 when that reproduces every value to the number
+of decimals it is written with (Amount's cents), and as float64
+otherwise. Non-numeric columns (string card ids, say) are stored as
+fixed-width strings, and so are integer-looking columns written with
+leading zeros ("00591"), which a numeric parse would merge with "591".
+Columns listed in text_columns are always kept as text.
+
+Later loads memory-map the columns, so only the columns that are
+actually used get read from disk:
+
+    from data_cache import load_dataset
+    df = load_dataset("creditcard.csv")                          # all columns
+    amounts = load_dataset("creditcard.csv", columns=["Amount", "Class"])
+    df = load_dataset("transactions.csv", text_columns=["card"])   # ids stay strings
+
+Usage:
+    python data_cache.py creditcard.csv   # build the cache and compare load times
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR_ENV = "FRAUD_DATA_CACHE"
+DEFAULT_CACHE_DIR = ".data_cache"
+CHUNK_SIZE = 200_000
+# Bump when the stored layout or dtype rules change, so older caches are rebuilt
+CACHE_FORMAT = 3
+MAX_DECIMALS = 8
+# An integer written with a leading zero is an identifier, not a number
+_LEADING_ZERO = re.compile(r"^\s*[+-]?0\d")
+
+_INT_TYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def content_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_hash(csv_path, cache_root):
+    """Content hash of csv_path, remembered per (size, mtime) so unchanged files aren't re-read."""
+    index_path = os.path.join(cache_root, "hashes.json")
+    stat = os.stat(csv_path)
+    key = os.path.abspath(csv_path)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    entry = index.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        return entry["sha256"]
+
+    digest = content_hash(csv_path)
+    index[key] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": digest}
+    os.makedirs(cache_root, exist_ok=True)
+    with open(index_path, "w") as f:
+        json.dump(index, f, indent=2)
+    return digest
+
+
+def cache_dir_for(csv_path, cache_root=None, text_columns=()):
+    if cache_root is None:
+        cache_root = os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.dirname(os.path.abspath(csv_path)),
+                                                                   DEFAULT_CACHE_DIR)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    suffix = ""
+    if text_columns:
+        # Forced text columns change the stored dtypes, so they get their own directory
+        suffix = "-t" + hashlib.sha256(json.dumps(sorted(text_columns)).encode()).hexdigest()[:8]
+    return os.path.join(cache_root, f"{name}-{_source_hash(csv_path, cache_root)[:16]}-v{CACHE_FORMAT}{suffix}")
+
+
+def _decimals(values):
+    """Fewest decimals (up to MAX_DECIMALS) that reproduce every value, or None if more are needed."""
+    for decimals in range(MAX_DECIMALS + 1):
+        if np.array_equal(np.round(values, decimals), values):
+            return decimals
+    return None
+
+
+def _float32_exact(values):
+    """True if float32 gives back every value to the precision it is written with."""
+    decimals = _decimals(values)
+    if decimals is None:
+        return False
+    return np.array_equal(np.round(values.astype(np.float32).astype(np.float64), decimals), values)
+
+
+def _choose_dtypes(csv_path, text_columns=()):
+    """First pass over the CSV: count rows and pick the narrowest safe dtype per column."""
+    n_rows = 0
+    columns = None
+    numeric, whole, integral, float32_ok, lo, hi = {}, {}, {}, {}, {}, {}
+    for chunk in pd.read_csv(csv_path, chunksize=CHUNK_SIZE):
+        if columns is None:
+            columns = list(chunk.columns)
+            unknown = [col for col in text_columns if col not in columns]
+            if unknown:
+                raise KeyError(f"text_columns not in {csv_path}: {unknown}")
+            for col in columns:
+                numeric[col], whole[col], float32_ok[col], lo[col], hi[col] = True, True, True, np.inf, -np.inf
+                numeric[col] = col not in text_columns
+                integral[col] = True  # every non-missing value is whole
+        n_rows += len(chunk)
+        for col in columns:
+            if not numeric[col]:
+                continue
+            if not pd.api.types.is_numeric_dtype(chunk[col]) or pd.api.types.is_bool_dtype(chunk[col]):
+                numeric[col] = False
+                continue
+            values = chunk[col].to_numpy(dtype=np.float64)
+            finite = values[np.isfinite(values)]
+            if integral[col] and not (finite == np.round(finite)).all():
+                integral[col] = False
+            if len(finite) < len(values):
+                whole[col] = False
+            elif whole[col] and not (values == np.round(values)).all():
+                whole[col] = False
+            if float32_ok[col] and not whole[col]:
+                float32_ok[col] = _float32_exact(finite)
+            lo[col] = min(lo[col], finite.min()) if len(finite) else lo[col]
+            hi[col] = max(hi[col], finite.max()) if len(finite) else hi[col]
+
+    text_columns = [col for col in columns if not numeric[col]]
+    integer_columns = [col for col in columns if numeric[col] and integral[col]]
+    width = {col: 1 for col in text_columns + integer_columns}
+    zero_padded = set()
+    if text_columns or integer_columns:
+        # On the text as written: widths for text columns, and integer columns that are zero-padded ids
+        for chunk in pd.read_csv(csv_path, chunksize=CHUNK_SIZE, usecols=text_columns + integer_columns,
+                                 dtype=str):
+            for col in text_columns + integer_columns:
+                values = chunk[col].fillna("")
+                width[col] = max(width[col], int(values.str.len().max()))
+                if col in integer_columns and col not in zero_padded and values.str.match(_LEADING_ZERO).any():
+                    zero_padded.add(col)
+        for col in zero_padded:
+            numeric[col] = False
+
+    dtypes = {}
+    for col in columns:
+        if not numeric[col]:
+            dtypes[col] = np.dtype(f"U{width[col]}")
+        elif whole[col]:
+            dtypes[col] = next(t for t in _INT_TYPES if np.iinfo(t).min <= lo[col] and hi[col] <= np.iinfo(t).max)
+        else:
+            dtypes[col] = np.float32 if float32_ok[col] else np.float64
+    return n_rows, columns, dtypes
+
+
+def build_cache(csv_path, cache_root=None, text_columns=()):
+    """Convert csv_path into the columnar cache (if not already there). Returns the cache directory."""
+    target = cache_dir_for(csv_path, cache_root, text_columns)
+    if os.path.exists(os.path.join(target, "meta.json")):
+        return target
+
+    n_rows, columns, dtypes = _choose_dtypes(csv_path, text_columns)
+
+    # Write into a temporary directory and rename, so an interrupted build is never picked up
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    outputs = {col: np.lib.format.open_memmap(os.path.join(tmp, f"{i}.npy"), mode="w+", dtype=dtypes[col],
+                                              shape=(n_rows,))
+               for i, col in enumerate(columns)}
+    start = 0
+    text_columns = [col for col in columns if np.dtype(dtypes[col]).kind == "U"]
+    for chunk in pd.read_csv(csv_path, chunksize=CHUNK_SIZE, dtype={col: str for col in text_columns}):
+        chunk[text_columns] = chunk[text_columns].fillna("")
+        for col in columns:
+            outputs[col][start:start + len(chunk)] = chunk[col].to_numpy().astype(dtypes[col])
+        start += len(chunk)
+    for array in outputs.values():
+        array.flush()
+    del outputs
+
+    meta = {
+        "source": os.path.abspath(csv_path),
+        "rows": n_rows,
+        "columns": columns,
+        "files": {col: f"{i}.npy" for i, col in enumerate(columns)},
+        "dtypes": {col: np.dtype(dtypes[col]).name for col in columns},
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return target
+
+
+def load_dataset(csv_path, columns=None, cache_root=None, mmap=True, text_columns=()):
+    """Return the dataset as a DataFrame, building the columnar cache on first use.
+
+    columns restricts the load to those columns; with mmap=True (default)
+    the columns are memory-mapped read-only rather than read into memory.
+    text_columns are kept as strings even if every value looks numeric.
+    """
+    cache = build_cache(csv_path, cache_root, text_columns)
+    with open(os.path.join(cache, "meta.json")) as f:
+        meta = json.load(f)
+    columns = meta["columns"] if columns is None else list(columns)
+    unknown = [col for col in columns if col not in meta["files"]]
+    if unknown:
+        raise KeyError(f"Columns not in {csv_path}: {unknown}")
+
+    mmap_mode = "r" if mmap else None
+    data = {col: np.load(os.path.join(cache, meta["files"][col]), mmap_mode=mmap_mode) for col in columns}
+    # copy=False keeps one block per column, backed by the memory-mapped files
+    return pd.DataFrame(data, copy=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build the columnar cache for a transaction CSV.")
+    parser.add_argument("csv", help="Raw CSV file, e.g. creditcard.csv")
+    parser.add_argument("--cache-dir", default=None, help="Cache root (default: $FRAUD_DATA_CACHE or .data_cache)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = build_cache(args.csv, args.cache_dir)
+    print(f"Cache at {cache} ({time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    raw = pd.read_csv(args.csv)
+    csv_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    cached = load_dataset(args.csv, cache_root=args.cache_dir)
+    cached_seconds = time.perf_counter() - start
+    print(f"read_csv: {csv_seconds:.3f}s, {raw.memory_usage().sum() / 1e6:.1f} MB")
+    print(f"cached:   {cached_seconds:.3f}s, {cached.memory_usage().sum() / 1e6:.1f} MB (memory-mapped)")
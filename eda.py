@@ -0,0 +1,408 @@
+"""Single-pass, mergeable EDA statistics for files larger than memory.
+
+The notebook's EDA (df.describe(), df.corr(), Amount IQR outliers,
+histograms) needs the whole float64 frame and scans it once per
+statistic. EDASummary reads chunks and updates, in one pass:
+
+    Moments            count, mean, min/max and the co-moment matrix, so
+                       variance, covariance and correlation (Chan et al.
+                       parallel merge of per-chunk Welford statistics),
+                       kept per pair of columns over the rows where both
+                       are present
+    QuantileSketch     approximate quantiles of every column (a
+                       compactor sketch: rank error well under 1% with the
+                       default k, a few MB regardless of row count)
+    Histogram          exact counts on power-of-two bin widths that
+                       coarsen as the observed range grows
+    by class           Moments and a Histogram per Class value
+
+Every part has merge(), so chunks can be summarized in worker processes
+and combined in any order (profile(..., workers=4)). The summary is a
+few MB and pickles; describe(), correlation(), quantiles(), outliers()
+and the plot helpers work from it alone. Missing and infinite values are
+skipped per column, like describe() and corr() skip NaN: counts are per
+column and correlations use the pairwise complete rows.
+
+Usage:
+    python eda.py creditcard.csv --workers 4 --output eda_summary.pkl
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Moments:
+    """Count, mean, min, max and co-moments of a set of columns, mergeable across chunks.
+
+    Non-finite values are missing. Everything is kept per pair of columns
+    (i, j) over the rows where both are present: count, the mean of
+    column i, the co-moment and the sum of squared deviations of column i.
+    The diagonal holds the per-column statistics.
+    """
+
+    def __init__(self, n_columns):
+        self.rows = 0
+        self.count = np.zeros((n_columns, n_columns))
+        self.pair_mean = np.zeros((n_columns, n_columns))
+        self.comoment = np.zeros((n_columns, n_columns))
+        self.sumsq = np.zeros((n_columns, n_columns))
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    @property
+    def n(self):
+        """Non-missing values per column."""
+        return np.diag(self.count).copy()
+
+    @property
+    def mean(self):
+        return np.diag(self.pair_mean).copy()
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return self
+        present = np.isfinite(X)
+        W = present.astype(np.float64)
+        # Shift by the column means first so the raw sums below don't cancel
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shift = np.nan_to_num((np.where(present, X, 0.0).sum(axis=0)) / W.sum(axis=0))
+        X0 = np.where(present, X - shift, 0.0)
+        chunk = Moments(X.shape[1])
+        chunk.rows = len(X)
+        chunk.count = W.T @ W
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nan_to_num((X0.T @ W) / chunk.count)  # mean of column i over rows with i and j
+        chunk.comoment = X0.T @ X0 - chunk.count * mean * mean.T
+        chunk.sumsq = (X0 * X0).T @ W - chunk.count * mean * mean
+        chunk.pair_mean = mean + shift[:, None]
+        chunk.min = np.where(present, X, np.inf).min(axis=0)
+        chunk.max = np.where(present, X, -np.inf).max(axis=0)
+        return self.merge(chunk)
+
+    def merge(self, other):
+        n = self.count + other.count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.nan_to_num(self.count * other.count / n)
+            share = np.nan_to_num(other.count / n)
+        delta = other.pair_mean - self.pair_mean
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.sumsq = self.sumsq + other.sumsq + delta * delta * weight
+        self.pair_mean = self.pair_mean + delta * share
+        self.count = n
+        self.rows += other.rows
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    def variance(self, ddof=1):
+        n = self.n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > ddof, np.diag(self.comoment) / (n - ddof), np.nan)
+
+    def correlation(self):
+        """Pairwise correlation over the rows where both columns are present (DataFrame.corr())."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.comoment / np.sqrt(self.sumsq * self.sumsq.T)
+        return np.where(self.count >= 2, corr, np.nan)
+
+
+class QuantileSketch:
+    """Approximate quantiles of every column from a compactor hierarchy.
+
+    Level h holds items that each stand for 2**h rows. A level with more
+    than k items is sorted and every other item (random offset) moves up
+    one level, so memory stays around k * log2(n / k) items per column.
+    Missing values are kept as NaN, which sorts after every number, and
+    are left out of the ranks, so each column's quantiles are those of its
+    present values.
+    """
+
+    def __init__(self, n_columns, k=2048, seed=0):
+        self.n_columns = n_columns
+        self.k = k
+        self.levels = []
+        self._rng = np.random.default_rng(seed)
+
+    def _add(self, level, items):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty((0, self.n_columns)))
+        self.levels[level] = np.concatenate([self.levels[level], items])
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items, axis=0)  # every column on its own
+                keep = len(items) % 2
+                self.levels[level] = items[len(items) - keep:]
+                self._add(level + 1, items[self._rng.integers(2):len(items) - keep:2])
+            level += 1
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        self._add(0, np.where(np.isfinite(X), X, np.nan))
+        self._compress()
+        return self
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            self._add(level, items)
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Array of shape (len(qs), n_columns)."""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, axis=0)  # NaN last
+        sorted_items = np.take_along_axis(items, order, axis=0)
+        cumulative = np.cumsum(weights[order] * ~np.isnan(sorted_items), axis=0)
+        targets = np.asarray(qs)[:, None] * cumulative[-1]
+        index = np.array([np.searchsorted(cumulative[:, j], targets[:, j]) for j in range(self.n_columns)]).T
+        result = np.take_along_axis(sorted_items, np.minimum(index, len(items) - 1), axis=0)
+        return np.where(cumulative[-1] > 0, result, np.nan)  # a column with no values has no quantiles
+
+    def rank(self, column, value):
+        """Approximate fraction of rows whose value in column (an index) is below value."""
+        items = np.concatenate([level[:, column] for level in self.levels])
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        present = weights[~np.isnan(items)].sum()
+        return float(weights[items < value].sum() / present) if present else float("nan")
+
+
+class Histogram:
+    """Exact counts in bins of width 2**e, coarsened (pairs merged) when the range outgrows max_bins."""
+
+    def __init__(self, max_bins=128, min_width=2.0 ** -10):
+        self.max_bins = max_bins
+        self.width = min_width
+        self.start = 0  # bin i covers [(start + i) * width, (start + i + 1) * width)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _coarsen(self):
+        index = self.start + np.arange(len(self.counts))
+        new_index = np.floor_divide(index, 2)
+        new_start = int(new_index[0]) if len(index) else 0
+        counts = np.zeros(int(new_index[-1]) - new_start + 1 if len(index) else 0, dtype=np.int64)
+        np.add.at(counts, new_index - new_start, self.counts)
+        self.counts, self.start, self.width = counts, new_start, self.width * 2
+
+    def _fit_range(self, low, high):
+        """Coarsen until [low, high] fits in max_bins together with the current bins."""
+        while True:
+            lo = int(np.floor(low / self.width))
+            hi = int(np.floor(high / self.width))
+            if len(self.counts):
+                lo, hi = min(lo, self.start), max(hi, self.start + len(self.counts) - 1)
+            if hi - lo + 1 <= self.max_bins:
+                break
+            self._coarsen()
+        if not len(self.counts):
+            self.start, self.counts = lo, np.zeros(hi - lo + 1, dtype=np.int64)
+        else:
+            counts = np.zeros(hi - lo + 1, dtype=np.int64)
+            counts[self.start - lo:self.start - lo + len(self.counts)] = self.counts
+            self.start, self.counts = lo, counts
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        self._fit_range(values.min(), values.max())
+        index = np.floor(values / self.width).astype(np.int64) - self.start
+        self.counts += np.bincount(index, minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        if not len(other.counts):
+            return self
+        other = _copy_histogram(other)
+        while other.width < self.width:
+            other._coarsen()
+        while self.width < other.width:
+            self._coarsen()
+        self._fit_range(other.start * other.width, (other.start + len(other.counts) - 1) * other.width)
+        while other.width < self.width:  # _fit_range may have coarsened self again
+            other._coarsen()
+        offset = other.start - self.start
+        self.counts[offset:offset + len(other.counts)] += other.counts
+        return self
+
+    def edges(self):
+        return (self.start + np.arange(len(self.counts) + 1)) * self.width
+
+
+def _copy_histogram(histogram):
+    copy = Histogram(histogram.max_bins, histogram.width)
+    copy.start, copy.counts = histogram.start, histogram.counts.copy()
+    return copy
+
+
+class EDASummary:
+    """All streaming statistics of a table; update() with chunks, merge() with other summaries."""
+
+    def __init__(self, columns, class_column="Class", k=2048, max_bins=128):
+        self.columns = list(columns)
+        self.class_column = class_column
+        self.moments = Moments(len(self.columns))
+        self.sketch = QuantileSketch(len(self.columns), k)
+        self.histograms = {column: Histogram(max_bins) for column in self.columns}
+        self.max_bins = max_bins
+        self.by_class = {}  # class value -> (Moments, {column: Histogram})
+
+    def update(self, frame):
+        X = frame[self.columns].to_numpy(dtype=np.float64)
+        self.moments.update(X)
+        self.sketch.update(X)
+        for j, column in enumerate(self.columns):
+            self.histograms[column].update(X[:, j])
+        if self.class_column in frame.columns:
+            labels = frame[self.class_column].to_numpy()
+            for value in np.unique(labels):
+                moments, histograms = self._class_stats(value.item())
+                rows = X[labels == value]
+                moments.update(rows)
+                for j, column in enumerate(self.columns):
+                    histograms[column].update(rows[:, j])
+        return self
+
+    def _class_stats(self, value):
+        if value not in self.by_class:
+            self.by_class[value] = (Moments(len(self.columns)),
+                                    {column: Histogram(self.max_bins) for column in self.columns})
+        return self.by_class[value]
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        for column in self.columns:
+            self.histograms[column].merge(other.histograms[column])
+        for value, (moments, histograms) in other.by_class.items():
+            own_moments, own_histograms = self._class_stats(value)
+            own_moments.merge(moments)
+            for column in self.columns:
+                own_histograms[column].merge(histograms[column])
+        return self
+
+    def quantiles(self, qs=(0.25, 0.5, 0.75)):
+        return pd.DataFrame(self.sketch.quantiles(qs), index=list(qs), columns=self.columns)
+
+    def describe(self):
+        """Same rows as DataFrame.describe(), with approximate quartiles."""
+        m = self.moments
+        empty = m.n == 0
+        stats = np.vstack([m.n, np.where(empty, np.nan, m.mean), np.sqrt(m.variance()),
+                           np.where(empty, np.nan, m.min), self.sketch.quantiles([0.25, 0.5, 0.75]),
+                           np.where(empty, np.nan, m.max)])
+        return pd.DataFrame(stats, index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+                            columns=self.columns)
+
+    def correlation(self):
+        return pd.DataFrame(self.moments.correlation(), index=self.columns, columns=self.columns)
+
+    def class_describe(self):
+        """Count, mean and std of every column per class value."""
+        rows = {}
+        for value, (moments, _) in sorted(self.by_class.items()):
+            rows[(value, "count")] = moments.n
+            rows[(value, "mean")] = moments.mean
+            rows[(value, "std")] = np.sqrt(moments.variance())
+        return pd.DataFrame(rows, index=self.columns).T
+
+    def outliers(self, column="Amount", factor=1.5):
+        """IQR bounds of a column and the approximate share of rows outside them."""
+        j = self.columns.index(column)
+        q1, q3 = self.sketch.quantiles([0.25, 0.75])[:, j]
+        low, high = q1 - factor * (q3 - q1), q3 + factor * (q3 - q1)
+        share = self.sketch.rank(j, low) + 1 - self.sketch.rank(j, np.nextafter(high, np.inf))
+        return {"lower": float(low), "upper": float(high), "share": share}
+
+
+def _summarize_chunk(args):
+    frame, columns, class_column, k, max_bins = args
+    return EDASummary(columns, class_column, k, max_bins).update(frame)
+
+
+def profile(path, chunk_size=100_000, workers=1, columns=None, class_column="Class", k=2048, max_bins=128):
+    """One pass over a CSV or Parquet file; chunks are summarized in `workers` processes and merged."""
+    from batch_score import iter_chunks
+
+    chunks = iter_chunks(path, chunk_size)
+    first = next(chunks)
+    if columns is None:
+        columns = [column for column in first.columns if pd.api.types.is_numeric_dtype(first[column])]
+    summary = EDASummary(columns, class_column, k, max_bins).update(first)
+
+    def tasks():
+        for frame in chunks:
+            yield frame, columns, class_column, k, max_bins
+
+    if workers > 1:
+        from multiprocessing import Pool
+
+        with Pool(workers) as pool:
+            for partial in pool.imap_unordered(_summarize_chunk, tasks()):
+                summary.merge(partial)
+    else:
+        for task in tasks():
+            summary.merge(_summarize_chunk(task))
+    return summary
+
+
+def plot_correlation(summary, columns=None, **heatmap_options):
+    """The notebook's seaborn heatmap, drawn from the summary's correlation matrix."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    corr = summary.correlation()
+    if columns is not None:
+        corr = corr.loc[columns, columns]
+    fig, ax = plt.subplots(figsize=(max(6, len(corr) * 0.6), max(5, len(corr) * 0.5)))
+    sns.heatmap(corr, cmap="coolwarm", center=0, ax=ax, **heatmap_options)
+    return fig
+
+
+def plot_histogram(summary, column, by_class=False):
+    """Plotly bar chart of a column's histogram (one trace per class with by_class)."""
+    import plotly.graph_objects as go
+
+    histograms = ({f"Class {value}": stats[1][column] for value, stats in sorted(summary.by_class.items())}
+                  if by_class else {column: summary.histograms[column]})
+    fig = go.Figure()
+    for name, histogram in histograms.items():
+        edges = histogram.edges()
+        fig.add_bar(x=(edges[:-1] + edges[1:]) / 2, y=histogram.counts, width=histogram.width, name=name)
+    fig.update_layout(title=f"{column} Distribution", xaxis_title=column, yaxis_title="Count",
+                      template="plotly_white", barmode="overlay")
+    return fig
+
+
+if __name__ == "__main__":
+    import argparse
+    import pickle
+    import time
+
+    parser = argparse.ArgumentParser(description="Single-pass EDA statistics for a large CSV or Parquet file.")
+    parser.add_argument("path", help="Input file, e.g. creditcard.csv")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=1, help="Processes summarizing chunks in parallel")
+    parser.add_argument("--output", default=None, help="Pickle the summary here for plotting later")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = profile(args.path, args.chunk_size, args.workers)
+    print(f"Profiled {summary.moments.rows:,} rows in {time.perf_counter() - start:.2f}s\n")
+    with pd.option_context("display.width", 200, "display.max_columns", 12):
+        print(summary.describe().T)
+        if summary.class_column in summary.columns:
+            print("\nCorrelations with Class:\n",
+                  summary.correlation()[summary.class_column].sort_values(ascending=False))
+    if "Amount" in summary.columns:
+        print("\nAmount IQR outliers:", summary.outliers("Amount"))
+    if args.output:
+        with open(args.output, "wb") as f:
+            pickle.dump(summary, f)
+        print(f"Saved summary to {args.output}")
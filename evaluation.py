@@ -0,0 +1,237 @@
+"""Vectorized evaluation and threshold sweep for many models at once.
+
+Each candidate model is scored with predict_proba exactly once
+(score_models, optionally cached on disk). sweep() then sorts every
+model's scores once and reads everything off the cumulative counts of
+that single pass:
+
+    roc_auc, pr_auc      exact, ties handled like sklearn's roc_auc_score
+                         and average_precision_score
+    threshold, cost      the cut minimizing fn_cost * FN + fp_cost * FP
+    precision/recall@b   when only the top b fraction of transactions can
+                         be reviewed (alert budgets)
+
+Bootstrap confidence intervals reuse the same sorted order: a resample is
+just a vector of multinomial row counts, so all resamples of a model are
+evaluated together as weighted cumulative sums.
+
+Usage:
+    python evaluation.py creditcard.csv fraud_detection_model.pkl models/*.pkl --bootstrap 200
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+DEFAULT_BUDGETS = (0.001, 0.005, 0.01)
+# A missed fraud costs about as much as a hundred needless manual reviews
+DEFAULT_FN_COST = 100.0
+DEFAULT_FP_COST = 1.0
+
+
+def score_models(models, X, cache_dir=None):
+    """Fraud probability of every row of X for each model in the dict name -> model.
+
+    With cache_dir, scores are stored as .npy files keyed by the pickled
+    model and the data, so re-running a comparison does not predict again.
+    """
+    import joblib
+
+    X_arr = np.ascontiguousarray(np.asarray(X))
+    data_key = hashlib.sha256(X_arr.tobytes()).hexdigest()[:16] if cache_dir else None
+    scores = {}
+    for name, model in models.items():
+        path = None
+        if cache_dir:
+            path = os.path.join(cache_dir, f"scores-{joblib.hash(model)[:16]}-{data_key}.npy")
+            if os.path.exists(path):
+                scores[name] = np.load(path)
+                continue
+        scores[name] = np.asarray(model.predict_proba(X)[:, 1], dtype=np.float64)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, scores[name])
+    return scores
+
+
+def _sorted_pass(score, y):
+    """Descending order of score, labels in that order, and tie-group start/end of every position."""
+    order = np.argsort(-score, kind="stable")
+    sorted_score = score[order]
+    n = len(score)
+    positions = np.arange(n)
+    last_of_group = np.append(sorted_score[1:] != sorted_score[:-1], True)
+    first_of_group = np.insert(last_of_group[:-1], 0, True)
+    ends = np.minimum.accumulate(np.where(last_of_group, positions, n)[::-1])[::-1]
+    starts = np.maximum.accumulate(np.where(first_of_group, positions, 0))
+    return order, sorted_score, y[order], starts, ends, last_of_group
+
+
+def _weighted_metrics(y_sorted, weights, starts, ends, budget_k):
+    """ROC AUC, average precision and top-k precision/recall for each row of weights (one per resample).
+
+    Only positives contribute to either curve area, so after one cumulative
+    sum over all rows the counts are gathered at the positives' positions.
+    """
+    positives = np.flatnonzero(y_sorted == 1)
+    cum_all = np.cumsum(weights, axis=1)
+    cum_pos = np.cumsum(weights[:, positives], axis=1)
+    cum_pos = np.concatenate([np.zeros((len(weights), 1)), cum_pos], axis=1)
+
+    def counts_through(index):
+        """Weighted (true positives, false positives) among the first index + 1 rows."""
+        tp = cum_pos[:, np.searchsorted(positives, index, side="right")]
+        return tp, np.take(cum_all, index, axis=1) - tp
+
+    n_pos = cum_pos[:, -1]
+    n_neg = cum_all[:, -1] - n_pos
+    w_pos = weights[:, positives]
+    group_start, group_end = starts[positives], ends[positives]
+
+    # Each positive beats the negatives below its tie group and half of those tied with it
+    tp_end, fp_end = counts_through(group_end)
+    tp_before, fp_before = counts_through(np.maximum(group_start - 1, 0))
+    fp_before = np.where(group_start > 0, fp_before, 0.0)
+    below_neg = n_neg[:, None] - fp_end
+    roc_auc = (w_pos * (below_neg + 0.5 * (fp_end - fp_before))).sum(axis=1) / (n_pos * n_neg)
+
+    # Precision is only defined at the end of a tie group; each positive adds recall there
+    # (a positive left out of a resample has weight 0 and may sit in an empty group)
+    flagged = tp_end + fp_end
+    pr_auc = (w_pos * np.divide(tp_end, flagged, out=np.zeros_like(flagged), where=flagged > 0)).sum(axis=1) / n_pos
+
+    # The budget counts resampled rows, so each resample has its own cut: the first
+    # position whose cumulative weight reaches k, keeping only the copies of that
+    # row that fit in the budget
+    cut = np.stack([np.searchsorted(row, budget_k) for row in cum_all])
+    cut = np.minimum(cut, cum_all.shape[1] - 1)
+    top_all = np.take_along_axis(cum_all, cut, axis=1)
+    top_tp = np.take_along_axis(cum_pos, np.searchsorted(positives, cut, side="right"), axis=1)
+    excess = np.maximum(top_all - budget_k, 0.0)
+    cut_is_positive = y_sorted[cut] == 1
+    top_tp = top_tp - np.where(cut_is_positive, excess, 0.0)
+    top_flagged = top_all - excess
+    precision_at = np.divide(top_tp, top_flagged, out=np.zeros_like(top_tp), where=top_flagged > 0)
+    recall_at = top_tp / n_pos[:, None]
+    return roc_auc, pr_auc, precision_at, recall_at
+
+
+def _budget_k(budgets, n):
+    return np.clip(np.ceil(np.asarray(budgets, dtype=np.float64) * n).astype(np.int64), 1, n)
+
+
+def sweep(scores, y, fn_cost=DEFAULT_FN_COST, fp_cost=DEFAULT_FP_COST, budgets=DEFAULT_BUDGETS,
+          n_bootstrap=0, confidence=0.95, random_state=42, bootstrap_chunk=50):
+    """Metrics of every model in the dict name -> scores against labels y.
+
+    Returns name -> dict with roc_auc, pr_auc, threshold (flag score >
+    threshold), cost, precision@b / recall@b for each budget b, and, with
+    n_bootstrap > 0, a "ci" dict of (low, high) intervals for the same
+    ranking metrics.
+    """
+    y = np.asarray(y).astype(np.float64)
+    n = len(y)
+    budget_k = _budget_k(budgets, n)
+    alpha = (1 - confidence) / 2
+    # Drawn once and shared, so every model is judged on the same resamples
+    rng = np.random.default_rng(random_state)
+    resamples = np.stack([np.bincount(rng.integers(0, n, n), minlength=n).astype(np.int32)
+                          for _ in range(n_bootstrap)]) if n_bootstrap else None
+    results = {}
+    for name, score in scores.items():
+        order, sorted_score, y_sorted, starts, ends, last_of_group = _sorted_pass(np.asarray(score, np.float64), y)
+        roc_auc, pr_auc, precision_at, recall_at = _weighted_metrics(y_sorted, np.ones((1, n)), starts,
+                                                                     ends, budget_k)
+
+        # Cost of cutting after each tie group, plus flagging nothing at all
+        tps = np.cumsum(y_sorted)[last_of_group]
+        fps = np.cumsum(1 - y_sorted)[last_of_group]
+        costs = np.concatenate([[fn_cost * tps[-1]], fn_cost * (tps[-1] - tps) + fp_cost * fps])
+        best = int(np.argmin(costs))
+        cut_scores = np.append(sorted_score[last_of_group], 0.0)
+        # Halfway between the last flagged and the first unflagged score, so > and >= agree
+        threshold = 1.0 if best == 0 else float((cut_scores[best - 1] + cut_scores[best]) / 2)
+
+        result = {"roc_auc": float(roc_auc[0]), "pr_auc": float(pr_auc[0]), "threshold": threshold,
+                  "cost": float(costs[best]), "flagged": int(0 if best == 0 else tps[best - 1] + fps[best - 1])}
+        for i, budget in enumerate(budgets):
+            result[f"precision@{budget:g}"] = float(precision_at[0, i])
+            result[f"recall@{budget:g}"] = float(recall_at[0, i])
+
+        if n_bootstrap:
+            samples = {key: [] for key in result if key not in ("threshold", "cost", "flagged")}
+            for start in range(0, n_bootstrap, bootstrap_chunk):
+                weights = resamples[start:start + bootstrap_chunk, order].astype(np.float64)
+                b_roc, b_pr, b_precision, b_recall = _weighted_metrics(y_sorted, weights, starts, ends, budget_k)
+                samples["roc_auc"].append(b_roc)
+                samples["pr_auc"].append(b_pr)
+                for i, budget in enumerate(budgets):
+                    samples[f"precision@{budget:g}"].append(b_precision[:, i])
+                    samples[f"recall@{budget:g}"].append(b_recall[:, i])
+            result["ci"] = {key: tuple(float(q) for q in np.nanquantile(np.concatenate(values), [alpha, 1 - alpha]))
+                            for key, values in samples.items()}
+        results[name] = result
+    return results
+
+
+def curves(scores, y):
+    """Full ROC and precision-recall curves of every model, one point per distinct score."""
+    y = np.asarray(y).astype(np.float64)
+    result = {}
+    for name, score in scores.items():
+        _, sorted_score, y_sorted, _, _, last_of_group = _sorted_pass(np.asarray(score, np.float64), y)
+        tps = np.cumsum(y_sorted)[last_of_group]
+        fps = np.cumsum(1 - y_sorted)[last_of_group]
+        result[name] = {"thresholds": sorted_score[last_of_group],
+                        "fpr": np.concatenate([[0.0], fps / fps[-1]]),
+                        "tpr": np.concatenate([[0.0], tps / tps[-1]]),
+                        "precision": tps / (tps + fps), "recall": tps / tps[-1]}
+    return result
+
+
+def format_table(results, budgets=DEFAULT_BUDGETS):
+    columns = ["roc_auc", "pr_auc"] + [f"{kind}@{b:g}" for b in budgets for kind in ("precision", "recall")]
+    width = max(len(name) for name in results) + 2
+    lines = [f"{'model':<{width}}" + "".join(f"{column:>16}" for column in columns)
+             + f"{'threshold':>11}{'cost':>10}"]
+    for name, result in results.items():
+        lines.append(f"{name:<{width}}" + "".join(f"{result[column]:>16.4f}" for column in columns)
+                     + f"{result['threshold']:>11.4g}{result['cost']:>10.0f}")
+        if "ci" in result:
+            lines.append(f"{'':<{width}}" + "".join(
+                f"{'%.3f-%.3f' % result['ci'][column]:>16}" for column in columns))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import warnings
+
+    from data_cache import load_dataset
+    from model_loader import load_model
+    from training_pipeline import default_cache_dir, merge_config, preprocess, split
+
+    parser = argparse.ArgumentParser(description="Compare saved models on the pipeline's test split.")
+    parser.add_argument("csv", help="Raw CSV file, e.g. creditcard.csv")
+    parser.add_argument("models", nargs="+", help="Saved models (.pkl)")
+    parser.add_argument("--fn-cost", type=float, default=DEFAULT_FN_COST, help="Cost of a missed fraud")
+    parser.add_argument("--fp-cost", type=float, default=DEFAULT_FP_COST, help="Cost of a false alert")
+    parser.add_argument("--budgets", type=float, nargs="+", default=list(DEFAULT_BUDGETS),
+                        help="Fractions of transactions that can be reviewed")
+    parser.add_argument("--bootstrap", type=int, default=0, help="Bootstrap resamples for confidence intervals")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Where to cache model scores (default: scores/ under the pipeline cache)")
+    args = parser.parse_args()
+    cache_dir = args.cache_dir or os.path.join(default_cache_dir(), "scores")
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    config = merge_config(None)
+    data = split(config["split"], preprocess(config["preprocess"], load_dataset(args.csv)))
+    start = time.perf_counter()
+    scores = score_models({path: load_model(path) for path in args.models}, data["X_test"], cache_dir)
+    scored = time.perf_counter()
+    results = sweep(scores, data["y_test"], args.fn_cost, args.fp_cost, args.budgets, args.bootstrap)
+    print(format_table(results, args.budgets))
+    print(f"Scored in {scored - start:.1f}s, swept in {time.perf_counter() - scored:.2f}s")
@@ -0,0 +1,158 @@
+"""Incremental model refresh from a chunk of newly labeled transactions.
+
+Instead of rerunning the whole training script (SMOTE on the full
+history, both searches and a StackingClassifier.fit that trains XGBoost
+once per internal fold plus once on everything), a refresh:
+
+1. continues boosting the saved XGBClassifier for a few extra rounds on
+   the new chunk, starting from its booster;
+2. computes out-of-fold probabilities of the updated booster on the chunk
+   (each fold continues boosting on the other folds only) and refits just
+   the Logistic Regression meta-learner on them;
+3. compares the old and new model on a holdout and writes the new model
+   as a versioned artifact with its manifest and compiled .npz.
+
+The chunk is as imbalanced as live traffic, so the extra rounds use
+scale_pos_weight = legit/fraud and the meta-learner balanced class
+weights, matching the balanced (SMOTE) data the model was trained on.
+
+Usage:
+    python incremental_refresh.py new_labeled.csv --holdout holdout.csv --rounds 20
+"""
+
+import copy
+import os
+import time
+
+import numpy as np
+
+from model_loader import FEATURE_COLUMNS, load_model, resolve_model_path
+from resampling import unwrap_estimator
+
+
+def continue_boosting(xgb_model, X, y, rounds):
+    """A new XGBClassifier with `rounds` more trees fit on X, y on top of xgb_model's booster."""
+    from xgboost import XGBClassifier
+
+    params = xgb_model.get_params()
+    params.update(n_estimators=rounds, scale_pos_weight=float((y == 0).sum() / max((y == 1).sum(), 1)))
+    updated = XGBClassifier(**params)
+    updated.fit(X, y, xgb_model=xgb_model.get_booster())
+    return updated
+
+
+def out_of_fold_proba(xgb_model, X, y, rounds, cv=5, random_state=42):
+    """Fraud probability of every row from a continued booster that never saw that row."""
+    from sklearn.model_selection import StratifiedKFold
+
+    oof = np.empty(len(y))
+    for train_idx, val_idx in StratifiedKFold(cv, shuffle=True, random_state=random_state).split(X, y):
+        fold_model = continue_boosting(xgb_model, X.iloc[train_idx], y[train_idx], rounds)
+        oof[val_idx] = fold_model.predict_proba(X.iloc[val_idx])[:, 1]
+    return oof
+
+
+def refresh(stacked_model, X, y, rounds=20, cv=5, random_state=42):
+    """Return a copy of stacked_model updated with the labeled chunk X, y.
+
+    Only the layout the training script builds can be refreshed: one
+    XGBClassifier base learner stacked on predict_proba under a
+    LogisticRegression meta-learner. Anything else raises ValueError
+    rather than silently dropping base learners or swapping the meta-learner.
+    """
+    import pandas as pd
+    from sklearn.linear_model import LogisticRegression
+    from xgboost import XGBClassifier
+
+    estimators = getattr(stacked_model, "estimators_", None)
+    if (estimators is None or len(estimators) != 1 or stacked_model.stack_method_ != ["predict_proba"]
+            or not isinstance(unwrap_estimator(estimators[0]), XGBClassifier)):
+        raise ValueError("Only a single XGBClassifier base learner stacked on predict_proba can be refreshed")
+    if not isinstance(unwrap_estimator(stacked_model.final_estimator_), LogisticRegression):
+        raise ValueError("Only a LogisticRegression meta-learner can be refreshed, got "
+                         f"{type(unwrap_estimator(stacked_model.final_estimator_)).__name__}")
+
+    # The booster checks feature names, so keep them on the new data
+    X = pd.DataFrame(np.asarray(X, dtype=np.float64), columns=FEATURE_COLUMNS)
+    y = np.asarray(y)
+    old_xgb = unwrap_estimator(estimators[0])
+
+    new_xgb = continue_boosting(old_xgb, X, y, rounds)
+    oof = out_of_fold_proba(old_xgb, X, y, rounds, cv, random_state)
+    meta_X = np.column_stack([oof, X.to_numpy()]) if stacked_model.passthrough else oof.reshape(-1, 1)
+    meta = LogisticRegression(class_weight="balanced", max_iter=1000).fit(meta_X, y)
+
+    refreshed = copy.deepcopy(stacked_model)
+    refreshed.estimators_[0] = new_xgb
+    refreshed.named_estimators_[refreshed.estimators[0][0]] = new_xgb
+    refreshed.final_estimator_ = meta
+    return refreshed
+
+
+def evaluate(model, X, y):
+    from sklearn.metrics import average_precision_score, recall_score, roc_auc_score
+
+    scores = model.predict_proba(X)[:, 1]
+    return {"roc_auc": roc_auc_score(y, scores), "pr_auc": average_precision_score(y, scores),
+            "recall": recall_score(y, (scores > 0.5).astype(int))}
+
+
+def save_version(model, output_dir, version):
+    """Write model, manifest and compiled arrays to output_dir; returns the model path."""
+    import joblib
+
+    from compiled_model import compiled_path_for, export_compiled
+    from model_loader import write_manifest
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"fraud_detection_model-{version}.pkl")
+    joblib.dump(model, path)
+    write_manifest(path, version)
+    export_compiled(model, compiled_path_for(path), source_path=path)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+    import warnings
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Refresh the model with newly labeled transactions.")
+    parser.add_argument("chunk", help="CSV with the 29 model features and Class")
+    parser.add_argument("--model", default=None, help="Model to refresh (default: $FRAUD_MODEL_PATH)")
+    parser.add_argument("--holdout", default=None, help="CSV to compare old and new model on "
+                                                        "(default: 20%% of the chunk)")
+    parser.add_argument("--rounds", type=int, default=20, help="Extra boosting rounds")
+    parser.add_argument("--cv", type=int, default=5, help="Folds for the out-of-fold meta-learner inputs")
+    parser.add_argument("--output-dir", default="models", help="Where to write the versioned artifact")
+    parser.add_argument("--max-auc-drop", type=float, default=0.01,
+                        help="Refuse to write the new model if holdout ROC AUC drops more than this")
+    parser.add_argument("--force", action="store_true", help="Write the new model even if it got worse")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    chunk = pd.read_csv(args.chunk)
+    if args.holdout:
+        train, holdout = chunk, pd.read_csv(args.holdout)
+    else:
+        from sklearn.model_selection import train_test_split
+
+        train, holdout = train_test_split(chunk, test_size=0.2, stratify=chunk["Class"], random_state=42)
+
+    model_path = resolve_model_path(args.model)
+    old_model = load_model(model_path)
+    start = time.perf_counter()
+    new_model = refresh(old_model, train[FEATURE_COLUMNS], train["Class"].to_numpy(), args.rounds, args.cv)
+    print(f"Refreshed on {len(train):,} rows in {time.perf_counter() - start:.1f}s")
+
+    X_holdout, y_holdout = holdout[FEATURE_COLUMNS], holdout["Class"].to_numpy()
+    old_metrics = evaluate(old_model, X_holdout, y_holdout)
+    new_metrics = evaluate(new_model, X_holdout, y_holdout)
+    for name in old_metrics:
+        print(f"{name:<10} old {old_metrics[name]:.4f}  new {new_metrics[name]:.4f}")
+
+    if new_metrics["roc_auc"] < old_metrics["roc_auc"] - args.max_auc_drop and not args.force:
+        raise SystemExit("Holdout ROC AUC dropped too much; not writing the new model (use --force to override)")
+    path = save_version(new_model, args.output_dir, time.strftime("%Y%m%d-%H%M%S"))
+    print(f"Wrote {path}; deploy with FRAUD_MODEL_PATH={path}")
@@ -0,0 +1,78 @@
+"""Load generator for scoring_service.py.
+
+Sends single-transaction requests from many concurrent clients and
+reports throughput and client-side p50/p99 latency, followed by the
+service's own /metrics.
+
+Usage:
+    python scoring_service.py --port 8000 &
+    python load_generator.py --url http://localhost:8000 --clients 32 --requests 5000
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from model_loader import FEATURE_COLUMNS
+
+
+def post_json(url, payload, timeout=10):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def get_json(url, timeout=10):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def run_load(url, clients=32, requests=5000, seed=42):
+    """Send `requests` single-row requests from `clients` threads. Returns a summary dict."""
+    rng = np.random.default_rng(seed)
+    transactions = rng.normal(size=(requests, len(FEATURE_COLUMNS))).tolist()
+    latencies = np.zeros(requests)
+    errors = []
+    next_index = iter(range(requests))
+    index_lock = threading.Lock()
+
+    def client():
+        while True:
+            with index_lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                post_json(f"{url}/score", {"transaction": transactions[i]})
+            except Exception as e:
+                errors.append(e)
+            latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {"requests": requests, "errors": len(errors), "seconds": round(elapsed, 3),
+            "requests_per_sec": round(requests / elapsed, 1), "p50_ms": round(p50, 3), "p99_ms": round(p99, 3)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate load against the scoring service.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--requests", type=int, default=5000, help="Total single-transaction requests")
+    args = parser.parse_args()
+
+    print("Client:", json.dumps(run_load(args.url, args.clients, args.requests)))
+    print("Service:", json.dumps(get_json(f"{args.url}/metrics")))
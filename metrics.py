@@ -0,0 +1,34 @@
+"""Latency bookkeeping shared by the serving and alerting code.
+
+LatencyRecorder keeps a bounded window of recent samples and reports the
+count and p50/p99 in milliseconds. scoring_service.py uses it for request
+latency and alerts.py for delivery latency, so neither has to import the
+other just for this.
+"""
+
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class LatencyRecorder:
+    """Keeps the most recent latencies and reports percentiles."""
+
+    def __init__(self, size=10_000):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            samples = np.array(self._samples)
+        if samples.size == 0:
+            return {"count": self.count}
+        p50, p99 = np.percentile(samples, [50, 99]) * 1000
+        return {"count": self.count, "p50_ms": round(p50, 3), "p99_ms": round(p99, 3)}
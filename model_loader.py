@@ -0,0 +1,187 @@
+"""Load the fraud detection model once per process.
+
+The model path comes from the FRAUD_MODEL_PATH environment variable and
+falls back to fraud_detection_model.pkl next to this file. If a
+model_manifest.json sits next to the artifact, the artifact's checksum
+is verified before it is unpickled. The manifest holds one entry per
+artifact file in its directory; an artifact without an entry is refused,
+so a manifest can't be bypassed by loading a different file next to it.
+
+joblib (and with it sklearn/xgboost) is only imported on the first load,
+and numpy payloads are memory-mapped so several processes loading the
+same file share its pages.
+
+Usage:
+    python model_loader.py --write-manifest   # record checksum of the current artifact
+    python model_loader.py                    # verify and time a cold load
+
+compiled_model.py can also turn the artifact into a NumPy-only model,
+loaded with load_compiled_model().
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+FEATURE_COLUMNS = [f"V{i}" for i in range(1, 29)] + ["Amount"]
+
+MODEL_PATH_ENV = "FRAUD_MODEL_PATH"
+DEFAULT_MODEL_FILE = "fraud_detection_model.pkl"
+MANIFEST_FILE = "model_manifest.json"
+
+_cache = {}
+_load_stats = {}
+_lock = threading.Lock()
+
+
+def resolve_model_path(path=None):
+    """Return the model path from the argument, the environment or the default."""
+    if path is None:
+        path = os.environ.get(MODEL_PATH_ENV) or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                              DEFAULT_MODEL_FILE)
+    return os.path.abspath(path)
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_path_for(model_path):
+    return os.path.join(os.path.dirname(model_path), MANIFEST_FILE)
+
+
+def read_manifest(manifest_path):
+    """File name -> entry for every artifact recorded in manifest_path."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if "file" in manifest:  # older single-artifact manifests
+        return {manifest["file"]: manifest}
+    return manifest
+
+
+def write_manifest(model_path=None, version=None):
+    """Record the checksum, size and library versions of a model artifact in its directory's manifest."""
+    import sklearn
+    import xgboost
+
+    model_path = resolve_model_path(model_path)
+    entry = {
+        "file": os.path.basename(model_path),
+        "version": version or time.strftime("%Y%m%d"),
+        "sha256": file_sha256(model_path),
+        "size": os.path.getsize(model_path),
+        "sklearn": sklearn.__version__,
+        "xgboost": xgboost.__version__,
+    }
+    manifest_path = manifest_path_for(model_path)
+    manifest = read_manifest(manifest_path) if os.path.exists(manifest_path) else {}
+    manifest[entry["file"]] = entry
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path)
+    return entry
+
+
+def verify_manifest(model_path):
+    """Check the artifact against its manifest entry. Returns the entry, or None if there is no manifest."""
+    manifest_path = manifest_path_for(model_path)
+    if not os.path.exists(manifest_path):
+        return None
+    entry = read_manifest(manifest_path).get(os.path.basename(model_path))
+    if entry is None:
+        raise ValueError(f"{model_path} has no entry in {manifest_path}; record it with "
+                         f"python model_loader.py --write-manifest --model {model_path}")
+
+    # Cheap size check first, then the full checksum
+    if os.path.getsize(model_path) != entry["size"] or file_sha256(model_path) != entry["sha256"]:
+        raise ValueError(f"{model_path} does not match the checksum in {manifest_path}")
+    return entry
+
+
+def load_model(path=None, mmap_mode="r"):
+    """Return the model at path, loading it on the first call only."""
+    model_path = resolve_model_path(path)
+    key = (model_path, os.path.getmtime(model_path))
+    model = _cache.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _cache.get(key)
+        if model is None:
+            start = time.perf_counter()
+            manifest = verify_manifest(model_path)
+            import joblib  # heavy: pulls in sklearn and xgboost on unpickling
+
+            model = joblib.load(model_path, mmap_mode=mmap_mode)
+            _cache[key] = model
+            _load_stats[model_path] = {
+                "load_seconds": time.perf_counter() - start,
+                "version": manifest["version"] if manifest else None,
+            }
+    return model
+
+
+def load_compiled_model(path=None):
+    """Return the NumPy-only model compiled from the artifact at path (see compiled_model.py).
+
+    Neither joblib, sklearn nor xgboost is imported. If the artifact itself
+    is present, the .npz must have been compiled from exactly that file.
+    """
+    from compiled_model import CompiledModel, compiled_path_for
+
+    model_path = resolve_model_path(path)
+    compiled_path = compiled_path_for(model_path)
+    source_mtime = os.path.getmtime(model_path) if os.path.exists(model_path) else None
+    key = (compiled_path, os.path.getmtime(compiled_path), source_mtime)
+    model = _cache.get(key)
+    if model is None:
+        with _lock:
+            model = _cache.get(key)
+            if model is None:
+                start = time.perf_counter()
+                model = CompiledModel.load(compiled_path)
+                if source_mtime is not None and model.source_sha256 != file_sha256(model_path):
+                    raise ValueError(f"{compiled_path} was not compiled from the current {model_path}; "
+                                     f"rerun python compiled_model.py --model {model_path}")
+                _cache[key] = model
+                _load_stats[compiled_path] = {"load_seconds": time.perf_counter() - start, "version": None}
+    return model
+
+
+def load_stats(path=None):
+    """Return load time and version for a loaded model, or an empty dict."""
+    return dict(_load_stats.get(resolve_model_path(path), {}))
+
+
+def clear_cache():
+    _cache.clear()
+    _load_stats.clear()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Verify or record the model artifact manifest.")
+    parser.add_argument("--model", default=None, help="Path to the saved model")
+    parser.add_argument("--write-manifest", action="store_true", help="Write model_manifest.json for the model")
+    parser.add_argument("--version", default=None, help="Version string to record in the manifest")
+    args = parser.parse_args()
+
+    if args.write_manifest:
+        print(json.dumps(write_manifest(args.model, args.version), indent=2))
+    else:
+        load_model(args.model)
+        cold = load_stats(args.model)
+        start = time.perf_counter()
+        load_model(args.model)
+        warm = time.perf_counter() - start
+        print(f"Cold load: {cold['load_seconds'] * 1000:.1f} ms (version {cold['version']})")
+        print(f"Cached load: {warm * 1e6:.1f} us")
@@ -0,0 +1,323 @@
+"""HTTP scoring service for the fraud detection model.
+
+Loads the stacked model once and serves JSON requests:
+
+    POST /score   {"transaction": {"V1": ..., "Amount": ...}}     -> {"score": 0.01, "label": 0}
+    POST /score   {"transactions": [[29 values], ...]}            -> {"scores": [...], "labels": [...]}
+    With --explain, flagged transactions also get "reasons" (top features, see explanations.py).
+    Flagged transactions are handed to the alert channels configured in the environment (alerts.py);
+    optional "id" and "card" keys of a transaction are passed along for deduplication.
+    With --velocity, transactions must be dicts with the card key (and ideally "Time", epoch seconds):
+    per-card velocity features from feature_store.py are appended, configured from the model's
+    .velocity.json (written by the pipeline's export stage) so they match training.
+    GET  /metrics  request counts, batch sizes and p50/p99 latency
+    GET  /health
+
+Concurrent single-transaction requests are gathered into micro-batches:
+a worker waits at most --max-wait-ms for up to --max-batch-size rows and
+scores them with one predict_proba call, so per-call sklearn overhead is
+shared instead of paid for every row.
+
+Usage:
+    python scoring_service.py --port 8000 --max-batch-size 64 --max-wait-ms 2 --workers 2
+"""
+
+import argparse
+import json
+import numbers
+import os
+import queue
+import threading
+import time
+import traceback
+import warnings
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from metrics import LatencyRecorder
+from model_loader import FEATURE_COLUMNS, load_compiled_model, load_model
+
+# catch_warnings swaps the process-wide filter list, so scoring threads take turns
+_PREDICT_LOCK = threading.Lock()
+
+
+class RequestError(ValueError):
+    """A malformed request; the message is safe to return to the client."""
+
+
+def predict_scores(model, X):
+    """Fraud probability of each row of the plain array X.
+
+    The model was fit on a DataFrame, so sklearn warns about the missing
+    feature names; that is silenced for this call only.
+    """
+    with _PREDICT_LOCK, warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return model.predict_proba(X)[:, 1]
+
+
+def to_feature_rows(transactions):
+    """Turn a list of transactions (dicts keyed by feature or lists of 29 values) into a 2-D array."""
+    if not isinstance(transactions, list) or not transactions:
+        raise RequestError("Expected a non-empty list of transactions")
+    rows = []
+    for i, transaction in enumerate(transactions):
+        if isinstance(transaction, dict):
+            missing = [col for col in FEATURE_COLUMNS if col not in transaction]
+            if missing:
+                raise RequestError(f"Transaction {i} is missing model features: {missing}")
+            transaction = [transaction[col] for col in FEATURE_COLUMNS]
+        if not isinstance(transaction, list) or len(transaction) != len(FEATURE_COLUMNS):
+            raise RequestError(f"Transaction {i} must be an object or a list of {len(FEATURE_COLUMNS)} numbers")
+        if not all(isinstance(value, numbers.Real) and not isinstance(value, bool) for value in transaction):
+            raise RequestError(f"Transaction {i} has non-numeric feature values")
+        rows.append(transaction)
+    X = np.asarray(rows, dtype=np.float64)
+    # One bad row would otherwise fail the whole micro-batch it lands in
+    bad = np.flatnonzero(~np.isfinite(X).all(axis=1))
+    if len(bad):
+        raise RequestError(f"Transaction {bad[0]} has non-finite feature values")
+    return X
+
+
+class MicroBatcher:
+    """Scores single rows in shared predict_proba calls.
+
+    submit() returns a Future of (score, reasons). Each worker thread
+    blocks for the first pending row, then keeps collecting until
+    max_batch_size rows are queued or max_wait seconds have passed, and
+    scores them together. With an explainer, the flagged rows of the
+    batch are explained together too; reasons is None otherwise.
+    """
+
+    def __init__(self, model, max_batch_size=64, max_wait=0.002, workers=2, explainer=None):
+        self.model = model
+        self.explainer = explainer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, row):
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                X = np.vstack([row for row, _ in batch])
+                scores = predict_scores(self.model, X)
+                if self.explainer is not None:
+                    reasons = [row["reasons"] for row in self.explainer.score_and_explain(X, scores)]
+                else:
+                    reasons = [None] * len(batch)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self.batches += 1
+                self.rows += len(batch)
+            for (_, future), score, row_reasons in zip(batch, scores, reasons):
+                future.set_result((float(score), row_reasons))
+
+
+class ScoringService:
+    """The model, the micro-batcher and the request counters behind the HTTP handler."""
+
+    def __init__(self, model, max_batch_size=64, max_wait=0.002, workers=2, threshold=0.5, explainer=None,
+                 alerts=None, feature_store=None):
+        self.model = model
+        self.feature_store = feature_store
+        self.threshold = threshold
+        self.explainer = explainer
+        self.alerts = alerts
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait, workers, explainer)
+        self.single_latency = LatencyRecorder()
+        self.batch_latency = LatencyRecorder()
+
+    def _features(self, transactions):
+        X = to_feature_rows(transactions)
+        if self.feature_store is not None:
+            try:
+                X = np.hstack([X, self.feature_store.observe_transactions(transactions)])
+            except (KeyError, TypeError, ValueError) as e:
+                raise RequestError(str(e)) from e
+        return X
+
+    def score_one(self, transaction):
+        start = time.perf_counter()
+        row = self._features([transaction])[0]
+        score, reasons = self.batcher.submit(row).result()
+        result = {"score": score, "label": int(score > self.threshold)}
+        if self.explainer is not None and result["label"]:
+            result["reasons"] = reasons
+        self.single_latency.record(time.perf_counter() - start)
+        if self.alerts is not None and result["label"]:
+            self._alert(transaction, result)
+        return result
+
+    def score_many(self, transactions):
+        # Client batches are already big enough to amortise the call overhead
+        start = time.perf_counter()
+        X = self._features(transactions)
+        scores = predict_scores(self.model, X)
+        result = {"scores": scores.tolist(), "labels": (scores > self.threshold).astype(int).tolist()}
+        if self.explainer is not None:
+            result["reasons"] = [row["reasons"] for row in self.explainer.score_and_explain(X, scores)]
+        self.batch_latency.record(time.perf_counter() - start)
+        if self.alerts is not None:
+            reasons = result.get("reasons")
+            for i in np.flatnonzero(scores > self.threshold):
+                self._alert(transactions[i], {"score": float(scores[i]), "label": 1,
+                                              "reasons": reasons[i] if reasons else None})
+        return result
+
+    def _alert(self, transaction, result):
+        # submit() only queues the alert; delivery happens on the dispatcher's threads
+        keys = ("id", "card") if isinstance(transaction, dict) else ()
+        self.alerts.submit({**{key: transaction[key] for key in keys if key in transaction}, **result})
+
+    def metrics(self):
+        batches = self.batcher.batches
+        metrics = {
+            "single": self.single_latency.summary(),
+            "batch": self.batch_latency.summary(),
+            "micro_batches": {"count": batches,
+                              "mean_size": round(self.batcher.rows / batches, 2) if batches else 0.0},
+        }
+        if self.explainer is not None:
+            metrics["explanations"] = self.explainer.stats()
+        if self.alerts is not None:
+            metrics["alerts"] = self.alerts.metrics()
+        if hasattr(self.model, "escalation_stats"):  # cascade.CascadeModel
+            metrics["cascade"] = self.model.escalation_stats()
+        return metrics
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    service = None  # set by make_server
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send_json(200, self.service.metrics())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/score":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError:
+                raise RequestError("Request body is not valid JSON") from None
+            if not isinstance(request, dict):
+                raise RequestError("Expected a JSON object with 'transaction' or 'transactions'")
+            if "transaction" in request:
+                result = self.service.score_one(request["transaction"])
+            elif "transactions" in request:
+                result = self.service.score_many(request["transactions"])
+            else:
+                raise RequestError("Expected 'transaction' or 'transactions' in the request body")
+        except RequestError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception:
+            # Model and library errors stay in the server log; clients only learn that scoring failed
+            traceback.print_exc()
+            self._send_json(500, {"error": "internal error while scoring"})
+            return
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass  # per-request logging costs more than the scoring itself
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 drops connections under concurrent load
+    request_queue_size = 1024
+
+
+def make_server(host="0.0.0.0", port=8000, model=None, **service_options):
+    """Build the HTTP server; call serve_forever() on the result to start it."""
+    handler = type("BoundScoringHandler", (ScoringHandler,),
+                   {"service": ScoringService(model if model is not None else load_model(), **service_options)})
+    return ScoringServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the fraud detection model over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--model", default=None, help="Path to the saved model (default: $FRAUD_MODEL_PATH)")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="Most rows scored in one micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="Longest a row waits for its micro-batch")
+    parser.add_argument("--workers", type=int, default=2, help="Micro-batch scoring threads")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Score above which a transaction is flagged")
+    parser.add_argument("--compiled", action="store_true", help="Use the NumPy-only model from compiled_model.py")
+    parser.add_argument("--explain", type=int, default=0, metavar="K",
+                        help="Return the top K reasons for flagged transactions")
+    parser.add_argument("--velocity", action="store_true", help="Add per-card velocity features")
+    parser.add_argument("--velocity-snapshot", default="velocity_snapshot.npz",
+                        help="Velocity state to resume from and save to every minute")
+    args = parser.parse_args(argv)
+
+    from alerts import from_env
+
+    model = load_compiled_model(args.model) if args.compiled else load_model(args.model)
+    explainer = None
+    if args.explain:
+        from explanations import Explainer
+
+        # Reasons come from the XGBoost trees, so this needs the full model even with --compiled
+        explainer = Explainer(load_model(args.model), top_k=args.explain, threshold=args.threshold)
+    feature_store = None
+    if args.velocity:
+        from feature_store import load_for_model
+        from model_loader import resolve_model_path
+
+        # Same windows, card key and amount scaling as training, from the .velocity.json export wrote
+        feature_store = load_for_model(resolve_model_path(args.model), args.velocity_snapshot)
+        feature_store.start_snapshots(args.velocity_snapshot)
+    server = make_server(args.host, args.port, model=model, max_batch_size=args.max_batch_size,
+                         max_wait=args.max_wait_ms / 1000, workers=args.workers, threshold=args.threshold,
+                         explainer=explainer, alerts=from_env(), feature_store=feature_store)
+    print(f"Serving on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Stacking with cached base learners and parallel folds.
+
+StackingClassifier fits every base learner once per internal CV fold
+(to get out-of-fold probabilities for the meta-learner) and once on the
+full data. fit_stacking() runs those fits in parallel (n_jobs) and wraps
+each base learner in CachedFoldEstimator, which stores every fitted fold
+model and the out-of-fold probabilities it produced on disk, keyed by the
+estimator's parameters and a hash of the data it saw.
+
+So trying another meta-learner, passthrough setting or an extra base
+learner (e.g. the tuned Random Forest) reuses the cached XGBoost folds
+instead of boosting again. The wrappers are removed after fitting; the
+returned model is a plain StackingClassifier like the one the training
+script saves.
+
+    from stacking import fit_stacking
+    model = fit_stacking({"xgb": xgb_model, "rf": best_rf}, LogisticRegression(), X, y)
+"""
+
+import hashlib
+import os
+
+import joblib
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+
+
+def default_cache_dir():
+    from training_pipeline import default_cache_dir as pipeline_cache_dir
+
+    return os.path.join(pipeline_cache_dir(), "stacking")
+
+
+def _array_hash(*arrays):
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(np.asarray(array))
+        digest.update(f"{array.shape}{array.dtype}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _estimator_key(estimator):
+    # deep=True lists nested parameters one by one, so the truncated repr of a
+    # wrapped estimator never has to stand in for them
+    params = sorted((name, type(value).__name__ if isinstance(value, BaseEstimator) else repr(value))
+                    for name, value in estimator.get_params(deep=True).items())
+    return hashlib.sha256(f"{type(estimator).__name__}{params}".encode()).hexdigest()
+
+
+class CachedFoldEstimator(ClassifierMixin, BaseEstimator):
+    """Wraps a classifier; fitted models and predicted probabilities are cached on disk.
+
+    fit() on data it has seen before loads the stored model, and
+    predict_proba() on rows it has already scored loads the stored
+    probabilities, which is what makes a repeated stacking run cheap.
+    """
+
+    def __init__(self, estimator, cache_dir=None):
+        self.estimator = estimator
+        self.cache_dir = cache_dir
+
+    def _path(self, kind, key):
+        return os.path.join(self.cache_dir or default_cache_dir(), f"{kind}-{key[:24]}")
+
+    def fit(self, X, y):
+        self.key_ = hashlib.sha256((_estimator_key(self.estimator) + _array_hash(X, y)).encode()).hexdigest()
+        path = self._path("model", self.key_) + ".joblib"
+        if os.path.exists(path):
+            self.estimator_ = joblib.load(path)
+        else:
+            self.estimator_ = clone(self.estimator).fit(X, y)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            joblib.dump(self.estimator_, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        self.classes_ = self.estimator_.classes_
+        for attribute in ("n_features_in_", "feature_names_in_"):
+            if hasattr(self.estimator_, attribute):
+                setattr(self, attribute, getattr(self.estimator_, attribute))
+        return self
+
+    def predict_proba(self, X):
+        path = self._path("proba", hashlib.sha256((self.key_ + _array_hash(X)).encode()).hexdigest()) + ".npy"
+        if os.path.exists(path):
+            return np.load(path)
+        proba = self.estimator_.predict_proba(X)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, proba)
+        os.replace(path + ".tmp", path)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def fit_stacking(estimators, final_estimator, X, y, passthrough=True, cv=5, n_jobs=-1,
+                 cache_dir=None):
+    """Fit a StackingClassifier over the named base estimators, reusing cached folds.
+
+    estimators is a dict name -> unfitted classifier. Folds and base
+    learners are fit in parallel with n_jobs. cache_dir defaults to
+    $FRAUD_PIPELINE_CACHE/stacking. Returns a fitted, unwrapped
+    StackingClassifier.
+    """
+    from sklearn.ensemble import StackingClassifier
+    from sklearn.model_selection import StratifiedKFold
+
+    # Resolved here, not in the workers, which may not share this process's environment
+    cache_dir = cache_dir or default_cache_dir()
+    stacked_model = StackingClassifier(
+        estimators=[(name, CachedFoldEstimator(estimator, cache_dir)) for name, estimator in estimators.items()],
+        final_estimator=final_estimator,
+        # A fixed splitter keeps the fold contents, and so the cache keys, stable between runs
+        cv=StratifiedKFold(n_splits=cv, shuffle=True, random_state=42),
+        passthrough=passthrough,
+        n_jobs=n_jobs,
+    )
+    stacked_model.fit(X, y)
+
+    # Serve the plain fitted models, not the caching wrappers
+    stacked_model.estimators_ = [wrapper.estimator_ for wrapper in stacked_model.estimators_]
+    stacked_model.estimators = [(name, estimator) for name, estimator in estimators.items()]
+    for name, fitted in zip(estimators, stacked_model.estimators_):
+        stacked_model.named_estimators_[name] = fitted
+    return stacked_model
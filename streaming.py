@@ -0,0 +1,480 @@
+"""Streaming fraud detection with pluggable sources and sinks.
+
+A stand-in for the Kafka pipeline in the README's future enhancements:
+
+    source --reader thread--> bounded queue --scorer thread--> sink
+                                                   |
+                                         commit offsets after the sink
+
+Sources (all yield (offset, record) where record is a dict with the 29
+model features, plus optional "id" and "event_time" in epoch seconds):
+
+    InProcessBroker   append-only topic with committed consumer offsets
+    FileTailSource    follows a JSONL file; the offset is the byte position,
+                      committed to <file>.offset
+    SocketSource      newline-delimited JSON over TCP
+
+The bounded queue gives backpressure: when scoring falls behind, the
+reader blocks and stops pulling from the source. The scorer adapts its
+micro-batch size, growing it while the queue backs up and shrinking it
+when a batch takes longer than the latency target. Offsets are committed
+only after the decisions reached the sink, so a crash replays records
+rather than losing them (at-least-once).
+
+A record that can't be scored (invalid JSON, missing or non-numeric
+features) is logged and published to the dead-letter sink, if there is
+one, and its offset is committed with the rest of the batch. Any other
+error in the reader or scorer thread is fatal: it is printed, both
+threads stop, `failed` turns true and stop() raises it.
+
+Usage:
+    python streaming.py --rate 5000 --seconds 10          # synthetic load through the in-process broker
+    python streaming.py --source-file tx.jsonl --sink-file decisions.jsonl --dead-letter-file rejected.jsonl
+"""
+
+import json
+import math
+import numbers
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+from collections import deque
+
+import numpy as np
+
+from model_loader import FEATURE_COLUMNS
+
+# --- Sources ----------------------------------------------------------------
+
+
+def parse_record(line):
+    """Decode one JSON line; undecodable lines become a record carrying the error for the dead-letter sink."""
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return {"_error": f"invalid JSON: {exc}", "_raw": line.decode("utf-8", "replace")[:1000]}
+
+
+class InProcessBroker:
+    """A single in-memory topic with consumer-group offsets, standing in for Kafka."""
+
+    def __init__(self):
+        self._log = []
+        self._committed = {}
+        self._cond = threading.Condition()
+
+    def publish(self, record):
+        with self._cond:
+            self._log.append(record)
+            self._cond.notify_all()
+
+    def consumer(self, group="fraud-scorer"):
+        return BrokerSource(self, group)
+
+    def __len__(self):
+        return len(self._log)
+
+
+class BrokerSource:
+    def __init__(self, broker, group):
+        self.broker = broker
+        self.group = group
+        self.position = broker._committed.get(group, 0)
+
+    def read(self, max_records, timeout=0.1):
+        with self.broker._cond:
+            if self.position >= len(self.broker._log):
+                self.broker._cond.wait(timeout)
+            end = min(len(self.broker._log), self.position + max_records)
+            records = [(offset, self.broker._log[offset]) for offset in range(self.position, end)]
+        self.position = end
+        return records
+
+    def commit(self, offset):
+        """Mark everything up to and including offset as processed."""
+        with self.broker._cond:
+            self.broker._committed[self.group] = offset + 1
+
+    def close(self):
+        pass
+
+
+class FileTailSource:
+    """Follows a JSONL file like `tail -f`; the committed byte offset survives restarts."""
+
+    def __init__(self, path, poll_interval=0.05):
+        self.path = path
+        self.offset_path = path + ".offset"
+        self.poll_interval = poll_interval
+        start = 0
+        if os.path.exists(self.offset_path):
+            with open(self.offset_path) as f:
+                start = int(f.read().strip() or 0)
+        self._file = open(path, "rb")
+        self._file.seek(start)
+
+    def read(self, max_records, timeout=0.1):
+        records = []
+        deadline = time.monotonic() + timeout
+        while len(records) < max_records:
+            position = self._file.tell()
+            line = self._file.readline()
+            if not line.endswith(b"\n"):  # nothing new, or a line still being written
+                self._file.seek(position)
+                if records or time.monotonic() >= deadline:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            if line.strip():
+                # The offset of a record is where the next one starts
+                records.append((self._file.tell(), parse_record(line)))
+        return records
+
+    def commit(self, offset):
+        tmp = self.offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def close(self):
+        self._file.close()
+
+
+class SocketSource:
+    """Accepts newline-delimited JSON records on a TCP port.
+
+    Lines go through a bounded buffer; when it is full the connection
+    threads stop reading, so TCP flow control pushes back on the sender.
+    There is no replay, so commit() is a no-op.
+    """
+
+    def __init__(self, host="127.0.0.1", port=9099, buffer_size=10_000):
+        self._buffer = queue.Queue(maxsize=buffer_size)
+        self._offset = 0
+        self._server = socket.create_server((host, port))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._receive, args=(conn,), daemon=True).start()
+
+    def _receive(self, conn):
+        with conn, conn.makefile("rb") as lines:
+            for line in lines:
+                if line.strip():
+                    self._buffer.put(parse_record(line))
+
+    def read(self, max_records, timeout=0.1):
+        records = []
+        try:
+            records.append(self._buffer.get(timeout=timeout))
+            while len(records) < max_records:
+                records.append(self._buffer.get_nowait())
+        except queue.Empty:
+            pass
+        start = self._offset
+        self._offset += len(records)
+        return list(zip(range(start, self._offset), records))
+
+    def commit(self, offset):
+        pass
+
+    def close(self):
+        self._server.close()
+
+
+# --- Sinks ------------------------------------------------------------------
+
+
+class BrokerSink:
+    """Publishes decisions to another InProcessBroker topic."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, decisions):
+        for decision in decisions:
+            self.broker.publish(decision)
+
+
+class JsonlSink:
+    """Appends decisions to a JSONL file, flushed once per batch."""
+
+    def __init__(self, path):
+        self._file = open(path, "a")
+
+    def publish(self, decisions):
+        self._file.write("".join(json.dumps(decision) + "\n" for decision in decisions))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# --- Consumer ---------------------------------------------------------------
+
+
+def record_error(record, feature_store=None):
+    """Why a source record can't be scored, or None if it can.
+
+    With a feature_store, the card key, event_time and amount it needs are checked too.
+    """
+    if not isinstance(record, dict):
+        return "record is not a JSON object"
+    if "_error" in record:
+        return record["_error"]
+    missing = [col for col in FEATURE_COLUMNS if col not in record]
+    if missing:
+        return f"missing model features: {missing}"
+    for col in FEATURE_COLUMNS + (["event_time"] if "event_time" in record else []):
+        value = record[col]
+        if not isinstance(value, numbers.Real) or isinstance(value, bool) or not math.isfinite(value):
+            return f"{col} is not a finite number: {value!r}"
+    if feature_store is not None:
+        return feature_store.transaction_error(record, time_key="event_time")
+    return None
+
+
+class StreamMetrics:
+    def __init__(self, window=50_000):
+        self.started = time.perf_counter()
+        self.records = 0
+        self.batches = 0
+        self.dead_letters = 0
+        self.latencies = deque(maxlen=window)
+        self.queue_depth = 0
+        self.batch_size = 0
+        self._lock = threading.Lock()
+
+    def record_batch(self, latencies):
+        with self._lock:
+            self.records += len(latencies)
+            self.batches += 1
+            self.latencies.extend(latencies)
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self.latencies)
+            elapsed = time.perf_counter() - self.started
+            result = {"records": self.records, "batches": self.batches, "dead_letters": self.dead_letters,
+                      "records_per_sec": round(self.records / max(elapsed, 1e-9), 1),
+                      "queue_depth": self.queue_depth, "batch_size": self.batch_size}
+        if latencies.size:
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            result.update({"e2e_p50_ms": round(p50, 2), "e2e_p99_ms": round(p99, 2)})
+        return result
+
+
+class StreamScorer:
+    """Reads from a source, scores adaptive micro-batches and writes decisions to a sink.
+
+    Unscorable records go to dead_letter (any sink; None only logs them).
+    """
+
+    def __init__(self, model, source, sink, threshold=0.5, queue_size=20_000, min_batch=16, max_batch=4096,
+                 target_batch_seconds=0.05, alerts=None, feature_store=None, dead_letter=None):
+        self.model = model
+        self.feature_store = feature_store
+        self.alerts = alerts
+        self.source = source
+        self.sink = sink
+        self.dead_letter = dead_letter
+        self.error = None
+        self.threshold = threshold
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.target_batch_seconds = target_batch_seconds
+        self.batch_size = min_batch
+        self.metrics = StreamMetrics()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    def _run(self, loop):
+        try:
+            loop()
+        except Exception as exc:
+            # Fatal: report it and stop both threads; the uncommitted records are replayed on restart
+            traceback.print_exc()
+            self.error = exc
+            self._stop.set()
+
+    def _read_loop(self):
+        while not self._stop.is_set():
+            for offset, record in self.source.read(self.max_batch):
+                # Blocks when the scorer is behind: that is the backpressure
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put((offset, record, time.time()), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _adapt(self, batch_seconds, backlog):
+        # Grow while work is waiting, shrink when a batch overshoots the latency target
+        if batch_seconds > self.target_batch_seconds:
+            self.batch_size = max(self.min_batch, self.batch_size // 2)
+        elif backlog > self.batch_size:
+            self.batch_size = min(self.max_batch, self.batch_size * 2)
+
+    def _score_loop(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if not batch:
+                continue
+            start = time.perf_counter()
+            last_offset = batch[-1][0]
+            errors = [record_error(record, self.feature_store) for _, record, _ in batch]
+            if any(errors):
+                self._dead_letter([(offset, record, error) for (offset, record, _), error in zip(batch, errors)
+                                   if error])
+                batch = [item for item, error in zip(batch, errors) if not error]
+            if batch:
+                X = np.array([[record[col] for col in FEATURE_COLUMNS] for _, record, _ in batch],
+                             dtype=np.float64)
+                if self.feature_store is not None:
+                    # Records carry epoch seconds in "event_time"
+                    X = np.hstack([X, self.feature_store.observe_transactions([record for _, record, _ in batch],
+                                                                               time_key="event_time")])
+                scores = self.model.predict_proba(X)[:, 1]
+                decided_at = time.time()
+                decisions = [{"id": record.get("id", offset), "score": float(score),
+                              "label": int(score > self.threshold)}
+                             for (offset, record, _), score in zip(batch, scores)]
+                self.sink.publish(decisions)
+            # Decisions and dead letters are out: now it is safe to move the committed offset
+            self.source.commit(last_offset)
+            if batch:
+                if self.alerts is not None:
+                    for decision, (_, record, _) in zip(decisions, batch):
+                        if decision["label"]:
+                            self.alerts.submit({**decision, "card": record.get("card")})
+                self.metrics.record_batch([decided_at - record.get("event_time", received)
+                                           for _, record, received in batch])
+            backlog = self._queue.qsize()
+            self.metrics.queue_depth = backlog
+            self._adapt(time.perf_counter() - start, backlog)
+            self.metrics.batch_size = self.batch_size
+
+    def _dead_letter(self, rejected):
+        for offset, _, error in rejected:
+            print(f"Dead-lettered record at offset {offset}: {error}")
+        if self.dead_letter is not None:
+            self.dead_letter.publish([{"offset": offset, "error": error, "record": record}
+                                      for offset, record, error in rejected])
+        with self.metrics._lock:
+            self.metrics.dead_letters += len(rejected)
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._run, args=(self._read_loop,), daemon=True),
+                         threading.Thread(target=self._run, args=(self._score_loop,), daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stop reading, score what is already queued, wait for both threads and close the source and sinks.
+
+        Raises RuntimeError if either thread failed.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self.source.close()
+        for sink in (self.sink, self.dead_letter):
+            if hasattr(sink, "close"):
+                sink.close()
+        if self.error is not None:
+            raise RuntimeError("Stream scoring stopped on an error") from self.error
+
+
+def produce_synthetic(broker, rate, seconds, seed=42):
+    """Publish synthetic transactions at roughly `rate` per second for `seconds`."""
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(int(rate * seconds), len(FEATURE_COLUMNS)))
+    tick = 0.01
+    per_tick = max(1, int(rate * tick))
+    start = time.perf_counter()
+    for i in range(0, len(features), per_tick):
+        for j, row in enumerate(features[i:i + per_tick], start=i):
+            record = dict(zip(FEATURE_COLUMNS, row.tolist()))
+            record.update({"id": j, "event_time": time.time()})
+            broker.publish(record)
+        delay = start + (i + per_tick) / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+if __name__ == "__main__":
+    import argparse
+    import warnings
+
+    from alerts import from_env
+    from model_loader import load_model
+
+    parser = argparse.ArgumentParser(description="Score a stream of transactions.")
+    parser.add_argument("--source-file", default=None, help="Tail this JSONL file instead of the synthetic broker")
+    parser.add_argument("--sink-file", default=None, help="Append decisions to this JSONL file")
+    parser.add_argument("--dead-letter-file", default=None,
+                        help="Append records that can't be scored to this JSONL file (default: only log them)")
+    parser.add_argument("--rate", type=float, default=5000, help="Synthetic transactions per second")
+    parser.add_argument("--seconds", type=float, default=10, help="How long to produce synthetic load")
+    parser.add_argument("--max-batch", type=int, default=4096)
+    parser.add_argument("--target-batch-ms", type=float, default=50, help="Latency target per micro-batch")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    # The pickled model: micro-batches grow to thousands of rows, where XGBoost's predictor beats compiled_model.py
+    model = load_model()
+    alerts = from_env()
+    decisions_broker = InProcessBroker()
+    sink = JsonlSink(args.sink_file) if args.sink_file else BrokerSink(decisions_broker)
+    dead_letter = JsonlSink(args.dead_letter_file) if args.dead_letter_file else None
+
+    if args.source_file:
+        scorer = StreamScorer(model, FileTailSource(args.source_file), sink, max_batch=args.max_batch,
+                              target_batch_seconds=args.target_batch_ms / 1000, alerts=alerts,
+                              dead_letter=dead_letter).start()
+        try:
+            while not scorer.failed:
+                time.sleep(5)
+                print(json.dumps(scorer.metrics.summary()))
+        except KeyboardInterrupt:
+            pass
+        scorer.stop()
+    else:
+        broker = InProcessBroker()
+        scorer = StreamScorer(model, broker.consumer(), sink, max_batch=args.max_batch,
+                              target_batch_seconds=args.target_batch_ms / 1000, alerts=alerts,
+                              dead_letter=dead_letter).start()
+        producer = threading.Thread(target=produce_synthetic, args=(broker, args.rate, args.seconds), daemon=True)
+        producer.start()
+        while producer.is_alive() and not scorer.failed:
+            producer.join(timeout=2)
+            print(json.dumps(scorer.metrics.summary()))
+        scorer.stop()
+        print("Final:", json.dumps(scorer.metrics.summary()))
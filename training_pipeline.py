@@ -0,0 +1,502 @@
+"""Stage-cached training pipeline.
+
+The steps of credit_card_fraud_detection.py as named stages:
+
+    ingest -> preprocess -> split -> resample -> fit
+                                             -> tune
+                                             -> stack -> (cascade) -> export
+
+Each stage's output is saved under .pipeline_cache/ with a key made from
+the stage's parameters and the keys of the stages it depends on (the
+ingest key includes the content hash of the CSV). A stage whose key is
+already cached is skipped, and its output is only loaded if a later
+stage has to be recomputed. So changing only the stack parameters does
+not redo SMOTE or the hyperparameter search, and a failed run picks up
+after the last completed stage. Every stage logs its wall time and peak
+RSS, and each run is appended to .pipeline_cache/runs.jsonl.
+
+Usage:
+    python training_pipeline.py creditcard.csv
+    python training_pipeline.py creditcard.csv --config my_params.json --until tune
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+
+import joblib
+
+CACHE_DIR_ENV = "FRAUD_PIPELINE_CACHE"
+DEFAULT_CACHE_DIR = ".pipeline_cache"
+
+# Stages that always run: ingest is already backed by data_cache, and export is
+# cheap and must recreate the artifact if it was deleted
+UNCACHED_STAGES = {"ingest", "export"}
+
+DEFAULT_CONFIG = {
+    # text_columns: kept as strings (e.g. a numeric-looking card id); zero-padded ids are detected anyway
+    "ingest": {"text_columns": []},
+    # velocity: None, or VelocityStore options plus "key" (the card column) to add per-card
+    # velocity features (feature_store.py); needs a card column, which creditcard.csv lacks
+    "preprocess": {"drop": ["Time"], "scale": ["Amount"], "velocity": None},
+    "split": {"test_size": 0.2, "random_state": 42},
+    # method: smote, approx_smote, on_the_fly or class_weight (see resampling.py)
+    "resample": {"method": "smote", "random_state": 42, "sampling_strategy": 1.0, "k_neighbors": 5},
+    "fit": {"rf_n_estimators": 100, "xgb_params": {"n_estimators": 100, "learning_rate": 0.1, "max_depth": 5,
+                                                   "subsample": 0.8, "colsample_bytree": 0.8}},
+    "tune": {
+        # engine "random" is the notebook's RandomizedSearchCV; "halving" uses tuning.halving_search
+        # with n_candidates, eta and budget_seconds instead of n_iter
+        "engine": "random", "n_candidates": 30, "eta": 3, "budget_seconds": None,
+        "cv": 3, "n_iter": 5, "n_jobs": -1, "random_state": 42,
+        "rf_param_dist": {"n_estimators": [100, 200], "max_depth": [None, 10, 20], "min_samples_split": [2, 5]},
+        "xgb_param_dist": {"n_estimators": [100, 200], "max_depth": [3, 5], "learning_rate": [0.05, 0.1],
+                           "subsample": [0.7, 0.8, 0.9], "colsample_bytree": [0.7, 0.8, 0.9]},
+    },
+    "stack": {
+        # Fitted fold models and out-of-fold probabilities are cached by stacking.fit_stacking, so
+        # changing final_estimator, passthrough or tuned_estimators does not refit the XGBoost folds.
+        # tuned_estimators adds "best_rf" and/or "best_xgb" from the tune stage as base learners.
+        "xgb_params": {"n_estimators": 200, "max_depth": 5, "learning_rate": 0.1}, "passthrough": True,
+        "tuned_estimators": [], "final_estimator": "lr", "final_params": {}, "cv": 5, "n_jobs": -1,
+    },
+    "cascade": {
+        # Opt-in: a Logistic Regression screen in front of the stack (cascade.py). Half of the test
+        # split calibrates the cutoff to max_recall_loss; the other half reports recall and escalation.
+        "enabled": False, "max_recall_loss": 0.01, "threshold": 0.5, "screen_params": {"max_iter": 1000},
+        "calibration_size": 0.5, "random_state": 42,
+    },
+    # compile also writes the NumPy-only model (compiled_model.py) next to path, so --compiled never
+    # serves an older model than the pickle
+    "export": {"path": "fraud_detection_model.pkl", "write_manifest": True, "compile": True,
+               "cascade_path": "fraud_detection_cascade.pkl"},
+}
+
+
+def _report(name, y_test, model, X_test):
+    """Classification report at 0.5 plus ranking metrics from one predict_proba call."""
+    from sklearn.metrics import classification_report
+
+    from evaluation import sweep
+
+    scores = model.predict_proba(X_test)[:, 1]
+    print(f"{name} Classification Report:\n", classification_report(y_test, (scores > 0.5).astype(int)))
+    metrics = sweep({name: scores}, y_test)[name]
+    print(f"{name} ROC AUC Score: {metrics['roc_auc']:.4f}  PR AUC: {metrics['pr_auc']:.4f}  "
+          f"cost-optimal threshold: {metrics['threshold']:.4g}")
+
+
+# --- Stages -----------------------------------------------------------------
+# Each stage takes its parameters plus the outputs of the stages it depends on.
+
+def ingest(params, csv_path):
+    from data_cache import load_dataset
+
+    return load_dataset(csv_path, text_columns=params["text_columns"])
+
+
+def preprocess(params, ingest):
+    from sklearn.preprocessing import StandardScaler
+
+    df = ingest
+    drop = list(params["drop"])
+    store = None
+    if params["velocity"]:
+        from feature_store import add_velocity_features
+
+        # Computed from the raw Time and Amount, before they are dropped or scaled
+        options = dict(params["velocity"])
+        key = options.pop("key", "card")
+        amount_column = options.get("amount_column", "Amount")
+        df, store = add_velocity_features(df, key=key, **options)
+        drop.append(key)
+    df = df.drop(columns=drop)
+    scaler = StandardScaler()
+    df[params["scale"]] = scaler.fit_transform(df[params["scale"]])
+    velocity = None
+    if store is not None:
+        # Serving sees the scaled amount; the store maps it back to the raw amount the sums were built from
+        velocity = {**store.options(), "key": key}
+        if amount_column in params["scale"]:
+            i = list(params["scale"]).index(amount_column)
+            velocity.update(amount_offset=float(scaler.mean_[i]), amount_scale=float(scaler.scale_[i]))
+    return {"df": df, "scaler": scaler, "velocity": velocity}
+
+
+def split(params, preprocess):
+    from sklearn.model_selection import train_test_split
+
+    df = preprocess["df"]
+    X = df.drop("Class", axis=1)
+    y = df["Class"]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=params["test_size"], stratify=y,
+                                                        random_state=params["random_state"])
+    print("Train Fraud Cases", int((y_train == 1).sum()))
+    print("Test Fraud Cases", int((y_test == 1).sum()))
+    return {"X_train": X_train, "X_test": X_test, "y_train": y_train, "y_test": y_test}
+
+
+def resample(params, split):
+    from resampling import resample as apply_resampling
+
+    resampled = apply_resampling(split["X_train"], split["y_train"], params["method"],
+                                 random_state=params["random_state"], sampling_strategy=params["sampling_strategy"],
+                                 k_neighbors=params["k_neighbors"])
+    print("Train Fraud Cases after resampling", int((resampled["y"] == 1).sum()))
+    return resampled
+
+
+def fit(params, split, resample):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+    from xgboost import XGBClassifier
+
+    from resampling import wrap_estimator
+
+    X, y = resample["X"], resample["y"]
+    X_test, y_test = split["X_test"], split["y_test"]
+
+    scaler = StandardScaler()
+    lr = wrap_estimator(LogisticRegression(), resample).fit(scaler.fit_transform(X), y)
+    _report("Logistic Regression", y_test, lr, scaler.transform(X_test))
+
+    rf = wrap_estimator(RandomForestClassifier(n_estimators=params["rf_n_estimators"], random_state=42),
+                        resample).fit(X, y)
+    _report("Random Forest", y_test, rf, X_test)
+
+    xgb = wrap_estimator(XGBClassifier(random_state=42, scale_pos_weight=resample["fraud_ratio"],
+                                       **params["xgb_params"]), resample).fit(X, y)
+    _report("XGBoost", y_test, xgb, X_test)
+    return {"lr_scaler": scaler, "lr": lr, "rf": rf, "xgb": xgb}
+
+
+def _halving_tune(params, split, resample, cache_dir=None):
+    from tuning import halving_search
+
+    if resample["on_the_fly"] is not None:
+        raise ValueError("The halving engine needs materialized training data; use another resampling method")
+    rf_param_dist = dict(params["rf_param_dist"])
+    if resample["class_weight"] is not None:
+        rf_param_dist["class_weight"] = [resample["class_weight"]]
+
+    best = {}
+    for model, name, param_dist in [("rf", "Random Forest", rf_param_dist),
+                                    ("xgb", "XGBoost", params["xgb_param_dist"])]:
+        # XGBoost derives scale_pos_weight from the class counts of the data it gets
+        result = halving_search(model, param_dist, resample["X"], resample["y"],
+                                n_candidates=params["n_candidates"], eta=params["eta"], cv=params["cv"],
+                                budget_seconds=params["budget_seconds"], n_jobs=params["n_jobs"],
+                                random_state=params["random_state"],
+                                trial_log=os.path.join(cache_dir, "trials.jsonl") if cache_dir else None)
+        print(f"Best {name} Parameters:", result["best_params"])
+        _report(name, split["y_test"], result["best_estimator"], split["X_test"])
+        best[model] = result
+    return {"best_rf": best["rf"]["best_estimator"], "best_xgb": best["xgb"]["best_estimator"],
+            "rf_params": best["rf"]["best_params"],
+            # With early stopping the refit keeps the stopping iteration, not the sampled n_estimators
+            "xgb_params": {**best["xgb"]["best_params"], **({"n_estimators": best["xgb"]["best_n_estimators"]}
+                                                            if "best_n_estimators" in best["xgb"] else {})}}
+
+
+def tune(params, split, resample, cache_dir=None):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import RandomizedSearchCV
+    from xgboost import XGBClassifier
+
+    if params["engine"] == "halving":
+        return _halving_tune(params, split, resample, cache_dir)
+    if params["engine"] != "random":
+        raise ValueError(f"Unknown tuning engine {params['engine']!r}")
+
+    from resampling import wrap_estimator
+
+    X, y = resample["X"], resample["y"]
+    search_options = {"scoring": "roc_auc", "cv": params["cv"], "n_iter": params["n_iter"],
+                      "n_jobs": params["n_jobs"], "random_state": params["random_state"]}
+    # Parameters of an on-the-fly wrapped model live under its inner estimator
+    prefix = "estimator__" if resample["on_the_fly"] is not None else ""
+
+    def search(estimator, param_dist):
+        searcher = RandomizedSearchCV(wrap_estimator(estimator, resample),
+                                      {prefix + name: values for name, values in param_dist.items()},
+                                      **search_options).fit(X, y)
+        return searcher.best_estimator_, {name[len(prefix):]: value for name, value in searcher.best_params_.items()}
+
+    best_rf, rf_params = search(RandomForestClassifier(random_state=42), params["rf_param_dist"])
+    print("Best RF Parameters:", rf_params)
+    _report("Random Forest", split["y_test"], best_rf, split["X_test"])
+
+    best_xgb, xgb_params = search(XGBClassifier(scale_pos_weight=resample["fraud_ratio"], random_state=42),
+                                  params["xgb_param_dist"])
+    print("Best XGBoost Parameters:", xgb_params)
+    _report("XGBoost", split["y_test"], best_xgb, split["X_test"])
+    return {"best_rf": best_rf, "best_xgb": best_xgb, "rf_params": rf_params, "xgb_params": xgb_params}
+
+
+def stack(params, split, resample, tune=None, cache_dir=None):
+    from sklearn.base import clone
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from xgboost import XGBClassifier
+
+    from resampling import wrap_estimator
+    from stacking import fit_stacking
+
+    final_estimators = {"lr": LogisticRegression, "rf": RandomForestClassifier}
+    if params["final_estimator"] not in final_estimators:
+        raise ValueError(f"Unknown final_estimator {params['final_estimator']!r}, "
+                         f"expected one of {sorted(final_estimators)}")
+
+    X, y = resample["X"], resample["y"]
+    estimators = {"xgb": wrap_estimator(XGBClassifier(scale_pos_weight=resample["fraud_ratio"], random_state=42,
+                                                      **params["xgb_params"]), resample)}
+    for name in params["tuned_estimators"]:
+        # Refit from the tuned parameters; the fold cache makes that free after the first run
+        estimators[name] = clone(tune[name])
+    meta_learner = wrap_estimator(final_estimators[params["final_estimator"]](**params["final_params"]), resample)
+    stacked_model = fit_stacking(estimators, meta_learner, X, y, passthrough=params["passthrough"],
+                                 cv=params["cv"], n_jobs=params["n_jobs"],
+                                 cache_dir=os.path.join(cache_dir, "stacking") if cache_dir else None)
+    _report(f"Stacking Model ({' + '.join(estimators)} -> {params['final_estimator']})", split["y_test"],
+            stacked_model, split["X_test"])
+    return stacked_model
+
+
+def cascade(params, split, resample, stack):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    from cascade import CascadeModel, calibrate_cutoff, compare_cost, evaluate_cascade, format_report
+    from resampling import wrap_estimator
+
+    # Like the fit stage's LR: unscaled V and Amount columns leave the solver far from converged
+    scaler = StandardScaler().fit(resample["X"])
+    screen = wrap_estimator(LogisticRegression(**params["screen_params"]), resample)
+    screen.fit(scaler.transform(resample["X"]), resample["y"])
+    X_cal, X_eval, y_cal, y_eval = train_test_split(split["X_test"], split["y_test"],
+                                                    train_size=params["calibration_size"],
+                                                    stratify=split["y_test"], random_state=params["random_state"])
+    cutoff = calibrate_cutoff(screen.predict_proba(scaler.transform(X_cal))[:, 1], stack.predict_proba(X_cal)[:, 1],
+                              y_cal, params["max_recall_loss"], params["threshold"])
+    model = CascadeModel(screen, stack, cutoff, params["threshold"], scaler=scaler)
+    metrics = {"cutoff": model.cutoff, **evaluate_cascade(model, X_eval, y_eval), **compare_cost(model, X_eval)}
+    print(f"Cascade (max recall loss {params['max_recall_loss']}) on {len(y_eval)} held-out rows:\n"
+          + format_report(metrics))
+    return model
+
+
+def export(params, stack, cascade=None, preprocess=None):
+    from feature_store import config_path_for, write_config
+
+    joblib.dump(stack, params["path"])
+    if params["write_manifest"]:
+        from model_loader import write_manifest
+
+        write_manifest(params["path"])
+    print(f"Saved model to {params['path']}")
+    # scoring_service.py --velocity rebuilds the training-time VelocityStore from this file
+    velocity_path = config_path_for(params["path"])
+    if preprocess is not None and preprocess["velocity"] is not None:
+        write_config(velocity_path, preprocess["velocity"])
+        print(f"Saved velocity options to {velocity_path}")
+    elif os.path.exists(velocity_path):
+        os.remove(velocity_path)
+    if params["compile"]:
+        from compiled_model import compiled_path_for, export_compiled
+
+        compiled_path = compiled_path_for(params["path"])
+        try:
+            export_compiled(stack, compiled_path, source_path=params["path"])
+            print(f"Saved compiled model to {compiled_path}")
+        except ValueError as e:
+            # Not compilable (e.g. several base learners); load_compiled_model would refuse a stale .npz anyway
+            if os.path.exists(compiled_path):
+                os.remove(compiled_path)
+            print(f"Not compiled: {e}")
+    if cascade is not None:
+        joblib.dump(cascade, params["cascade_path"])
+        if params["write_manifest"]:
+            from model_loader import write_manifest
+
+            # load_model refuses an artifact the manifest has no entry for
+            write_manifest(params["cascade_path"])
+        print(f"Saved cascade to {params['cascade_path']}")
+    return params["path"]
+
+
+# Stage name -> (function, names of the stages it depends on), in run order
+STAGES = {
+    "ingest": (ingest, []),
+    "preprocess": (preprocess, ["ingest"]),
+    "split": (split, ["preprocess"]),
+    "resample": (resample, ["split"]),
+    "fit": (fit, ["split", "resample"]),
+    "tune": (tune, ["split", "resample"]),
+    "stack": (stack, ["split", "resample"]),
+    "cascade": (cascade, ["split", "resample", "stack"]),
+    "export": (export, ["stack"]),
+}
+
+
+def stage_enabled(name, config):
+    return name != "cascade" or config["cascade"]["enabled"]
+
+
+def stage_deps(name, config):
+    """Upstream stages of `name`; stack only needs tune when it stacks tuned estimators, and
+    export only needs cascade when it is enabled and preprocess when it adds velocity features."""
+    deps = STAGES[name][1]
+    if name == "stack" and config["stack"]["tuned_estimators"]:
+        deps = deps + ["tune"]
+    if name == "export" and stage_enabled("cascade", config):
+        deps = deps + ["cascade"]
+    if name == "export" and config["preprocess"]["velocity"]:
+        deps = deps + ["preprocess"]
+    return deps
+
+
+# --- Runner -----------------------------------------------------------------
+
+class PeakRSS:
+    """Samples the process RSS in a background thread and keeps the peak (and the RSS at entry)."""
+
+    def __init__(self, interval=0.05):
+        import psutil
+
+        self._process = psutil.Process()
+        self._interval = interval
+        self._stop = threading.Event()
+        self.peak = 0
+
+    def _sample(self):
+        while True:
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            if self._stop.wait(self._interval):
+                return
+
+    def __enter__(self):
+        self.start = self.peak = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+
+def _hash(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def merge_config(overrides):
+    """DEFAULT_CONFIG with the per-stage dicts in overrides applied on top."""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    for stage, params in (overrides or {}).items():
+        if stage not in config:
+            raise KeyError(f"Unknown stage {stage!r}")
+        config[stage].update(params)
+    return config
+
+
+def stage_keys(config, csv_path):
+    """Cache key of every stage, computed from parameters and upstream keys only."""
+    from data_cache import cache_dir_for
+
+    keys = {}
+    for name in STAGES:
+        inputs = {"params": config[name], "deps": [keys[dep] for dep in stage_deps(name, config)]}
+        if name == "ingest":
+            inputs["data"] = os.path.basename(cache_dir_for(csv_path))  # includes the CSV content hash
+        keys[name] = _hash({"stage": name, **inputs})
+    return keys
+
+
+def default_cache_dir():
+    """The pipeline's cache root: $FRAUD_PIPELINE_CACHE, else .pipeline_cache."""
+    return os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+
+
+def run_pipeline(csv_path, config=None, until=None, cache_dir=None):
+    """Run the stages in order (up to and including `until`) and return their timing records."""
+    config = merge_config(config)
+    cache_dir = cache_dir or default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    keys = stage_keys(config, csv_path)
+    names = list(STAGES)
+    if until is not None:
+        names = names[:names.index(until) + 1]
+    names = [name for name in names if stage_enabled(name, config)]
+
+    outputs = {}
+
+    def cache_path(name):
+        return os.path.join(cache_dir, f"{name}-{keys[name]}.joblib")
+
+    def output_of(name):
+        if name not in outputs and name not in UNCACHED_STAGES and os.path.exists(cache_path(name)):
+            outputs[name] = joblib.load(cache_path(name))
+        elif name not in outputs:
+            run_stage(name)
+        return outputs[name]
+
+    records = []
+
+    def run_stage(name):
+        func = STAGES[name][0]
+        dep_outputs = {dep: output_of(dep) for dep in stage_deps(name, config)}
+        if name == "ingest":
+            dep_outputs["csv_path"] = csv_path
+        if name in ("tune", "stack"):
+            dep_outputs["cache_dir"] = cache_dir
+        print(f"[{name}] running")
+        start = time.perf_counter()
+        with PeakRSS() as rss:
+            outputs[name] = func(config[name], **dep_outputs)
+        elapsed = time.perf_counter() - start
+        if name not in UNCACHED_STAGES:
+            tmp = cache_path(name) + ".tmp"
+            joblib.dump(outputs[name], tmp)
+            os.replace(tmp, cache_path(name))
+        records.append({"stage": name, "key": keys[name], "cached": False, "seconds": round(elapsed, 3),
+                        "peak_rss_mb": round(rss.peak / 1e6, 1)})
+        print(f"[{name}] done in {elapsed:.2f}s, peak RSS {rss.peak / 1e6:.0f} MB")
+
+    for name in names:
+        if name not in UNCACHED_STAGES and os.path.exists(cache_path(name)):
+            print(f"[{name}] cached ({keys[name]})")
+            records.append({"stage": name, "key": keys[name], "cached": True, "seconds": 0.0,
+                            "peak_rss_mb": None})
+        elif name not in outputs:
+            run_stage(name)
+
+    with open(os.path.join(cache_dir, "runs.jsonl"), "a") as f:
+        f.write(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "csv": os.path.abspath(csv_path),
+                            "stages": records}) + "\n")
+    return records
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the stage-cached training pipeline.")
+    parser.add_argument("csv", help="Raw CSV file, e.g. creditcard.csv")
+    parser.add_argument("--config", default=None, help="JSON file with per-stage parameter overrides")
+    parser.add_argument("--until", default=None, choices=list(STAGES), help="Stop after this stage")
+    parser.add_argument("--cache-dir", default=None, help="Stage cache (default: $FRAUD_PIPELINE_CACHE or .pipeline_cache)")
+    args = parser.parse_args()
+
+    overrides = None
+    if args.config:
+        with open(args.config) as f:
+            overrides = json.load(f)
+    records = run_pipeline(args.csv, overrides, until=args.until, cache_dir=args.cache_dir)
+    for record in records:
+        status = "cached" if record["cached"] else f"{record['seconds']:.2f}s, {record['peak_rss_mb']:.0f} MB"
+        print(f"{record['stage']:<12}{status}")
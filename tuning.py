@@ -0,0 +1,237 @@
+"""Budget-aware hyperparameter search with successive halving.
+
+A replacement for the RandomizedSearchCV sweeps in the training script.
+Many more candidates are sampled, but each rung only fits the survivors
+of the previous one on a larger share of the training rows:
+
+    rung 0: all candidates,       min_resource rows per fold
+    rung 1: best 1/eta of them,   eta * min_resource rows
+    ...     until the full training fold is used
+
+XGBoost candidates stop boosting early once the AUC on a stopping split
+held out of their training rows stops improving; the validation fold is
+only used for scoring, so early stopping doesn't inflate the scores. The
+final refit uses the best candidate's mean stopping iteration as
+n_estimators, so the refit model is the one that was scored. Rungs end
+early when a single candidate survives. The wall-clock budget is checked
+between batches of fits: a rung the budget cuts short is dropped (the
+first rung keeps its fully scored candidates), and the best candidate of
+the highest completed rung is returned.
+
+The training matrix is written once to a memory-mapped .npy file, so
+the joblib workers read the same pages instead of receiving a pickled
+copy each. Every (candidate, rung, fold) score is appended to a JSONL
+trial log and reused by later searches over the same data.
+
+    from tuning import halving_search
+    result = halving_search("xgb", param_dist, X, y, n_candidates=60, budget_seconds=600)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def default_trial_log():
+    from training_pipeline import default_cache_dir
+
+    return os.path.join(default_cache_dir(), "trials.jsonl")
+
+
+def make_estimator(model, params, fraud_ratio=1.0, early_stopping_rounds=None):
+    """Build the estimator for 'rf' or 'xgb' with the given hyperparameters."""
+    if model == "rf":
+        from sklearn.ensemble import RandomForestClassifier
+
+        return RandomForestClassifier(random_state=42, **params)
+    if model == "xgb":
+        from xgboost import XGBClassifier
+
+        return XGBClassifier(scale_pos_weight=fraud_ratio, random_state=42, eval_metric="auc",
+                             early_stopping_rounds=early_stopping_rounds, **params)
+    raise ValueError(f"Unknown model {model!r}")
+
+
+def _evaluate(model, params, X, y, train_idx, val_idx, fraud_ratio, early_stopping_rounds, stop_fraction,
+              random_state):
+    """Fit one candidate on one fold; returns (validation ROC AUC, trees kept or None, seconds).
+
+    With early stopping, boosting is stopped on a stratified stop_fraction
+    of train_idx, never on the validation fold it is scored on.
+    """
+    from sklearn.metrics import roc_auc_score
+    from sklearn.model_selection import train_test_split
+
+    start = time.perf_counter()
+    estimator = make_estimator(model, params, fraud_ratio, early_stopping_rounds)
+    n_trees = None
+    if model == "xgb" and early_stopping_rounds:
+        fit_idx, stop_idx = train_test_split(train_idx, test_size=stop_fraction, stratify=y[train_idx],
+                                             random_state=random_state)
+        estimator.fit(X[fit_idx], y[fit_idx], eval_set=[(X[stop_idx], y[stop_idx])], verbose=False)
+        n_trees = int(estimator.best_iteration) + 1
+    else:
+        estimator.fit(X[train_idx], y[train_idx])
+    score = roc_auc_score(y[val_idx], estimator.predict_proba(X[val_idx])[:, 1])
+    return float(score), n_trees, time.perf_counter() - start
+
+
+def _stratified_subset(train_idx, y, n_rows, rng):
+    """First n_rows of train_idx, keeping the class proportions."""
+    if n_rows >= len(train_idx):
+        return train_idx
+    parts = []
+    for label in np.unique(y[train_idx]):
+        members = train_idx[y[train_idx] == label]
+        take = max(1, int(round(len(members) * n_rows / len(train_idx))))
+        parts.append(rng.permutation(members)[:take])
+    return np.sort(np.concatenate(parts))
+
+
+def _data_key(X, y, cv, random_state):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X).tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    digest.update(f"{X.shape}{cv}{random_state}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _load_trials(trial_log, data_key, model, early_stopping_rounds):
+    """(params, rows, fold) -> {"score", "n_trees"} for the logged trials of this search setup."""
+    trials = {}
+    if trial_log and os.path.exists(trial_log):
+        with open(trial_log) as f:
+            for line in f:
+                trial = json.loads(line)
+                if (trial["data_key"] == data_key and trial["model"] == model
+                        and trial.get("early_stopping_rounds", "missing") == early_stopping_rounds):
+                    key = (json.dumps(trial["params"], sort_keys=True), trial["resource"], trial["fold"])
+                    trials[key] = {"score": trial["score"], "n_trees": trial.get("n_trees")}
+    return trials
+
+
+def halving_search(model, param_dist, X, y, n_candidates=30, eta=3, min_resource=None, cv=3,
+                   budget_seconds=None, early_stopping_rounds=20, stop_fraction=0.2, n_jobs=-1, random_state=42,
+                   trial_log=None, refit=True):
+    """Successive-halving search over param_dist for model ('rf' or 'xgb').
+
+    trial_log defaults to trials.jsonl in the pipeline cache
+    ($FRAUD_PIPELINE_CACHE or .pipeline_cache); pass False to disable it.
+
+    Returns a dict with best_params, best_score (mean CV ROC AUC at the
+    highest completed rung), best_n_estimators for early-stopped XGBoost,
+    the refit best_estimator (if refit) and the list of rungs with their
+    candidate scores.
+    """
+    from joblib import Parallel, delayed, effective_n_jobs
+    from sklearn.model_selection import ParameterSampler, StratifiedKFold
+
+    start = time.perf_counter()
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    fraud_ratio = float((y == 0).sum() / (y == 1).sum())
+    rng = np.random.default_rng(random_state)
+    if model != "xgb":
+        early_stopping_rounds = None  # only XGBoost stops early; RF trials are shared across settings
+
+    folds = list(StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state).split(X, y))
+    fold_rows = min(len(train) for train, _ in folds)
+    candidates = [dict(params) for params in ParameterSampler(param_dist, n_candidates, random_state=random_state)]
+    n_rungs = max(1, int(np.floor(np.log(len(candidates)) / np.log(eta))) + 1)
+    if min_resource is None:
+        min_resource = max(1000, fold_rows // eta ** (n_rungs - 1))
+
+    if trial_log is None:
+        trial_log = default_trial_log()
+    data_key = _data_key(X, y, cv, random_state)
+    known = _load_trials(trial_log, data_key, model, early_stopping_rounds)
+    batch_size = cv * effective_n_jobs(n_jobs)
+
+    def over_budget():
+        return budget_seconds is not None and time.perf_counter() - start > budget_seconds
+
+    rungs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # One on-disk copy of the data; joblib passes the memmaps to workers by reference
+        np.save(os.path.join(tmp, "X.npy"), X)
+        np.save(os.path.join(tmp, "y.npy"), y)
+        X_shared = np.load(os.path.join(tmp, "X.npy"), mmap_mode="r")
+        y_shared = np.load(os.path.join(tmp, "y.npy"), mmap_mode="r")
+
+        survivors = candidates
+        resource = min_resource
+        with Parallel(n_jobs=n_jobs) as parallel:
+            for rung in range(n_rungs):
+                if rungs and len(survivors) == 1:
+                    break  # nothing left to compare
+                if rungs and over_budget():
+                    print(f"Budget of {budget_seconds}s spent after {len(rungs)} rungs")
+                    break
+                n_rows = fold_rows if rung == n_rungs - 1 else min(resource, fold_rows)
+                subsets = [_stratified_subset(train, y, n_rows, rng) for train, _ in folds]
+
+                jobs, job_keys = [], []
+                for params in survivors:
+                    for fold, (train_sub, (_, val)) in enumerate(zip(subsets, folds)):
+                        key = (json.dumps(params, sort_keys=True), n_rows, fold)
+                        if key not in known:
+                            job_keys.append(key)
+                            jobs.append(delayed(_evaluate)(model, params, X_shared, y_shared, train_sub, val,
+                                                           fraud_ratio, early_stopping_rounds, stop_fraction,
+                                                           random_state))
+
+                cut_short = False
+                for batch in range(0, len(jobs), batch_size):
+                    if batch and over_budget():
+                        cut_short = True
+                        break
+                    batch_keys = job_keys[batch:batch + batch_size]
+                    results = parallel(jobs[batch:batch + batch_size])
+                    if trial_log:
+                        os.makedirs(os.path.dirname(trial_log) or ".", exist_ok=True)
+                        with open(trial_log, "a") as f:
+                            for key, (score, n_trees, seconds) in zip(batch_keys, results):
+                                f.write(json.dumps({"data_key": data_key, "model": model,
+                                                    "early_stopping_rounds": early_stopping_rounds,
+                                                    "params": json.loads(key[0]), "resource": key[1],
+                                                    "fold": key[2], "score": score, "n_trees": n_trees,
+                                                    "seconds": round(seconds, 3)}) + "\n")
+                    for key, (score, n_trees, _) in zip(batch_keys, results):
+                        known[key] = {"score": score, "n_trees": n_trees}
+
+                scored = [p for p in survivors
+                          if all((json.dumps(p, sort_keys=True), n_rows, fold) in known for fold in range(cv))]
+                if cut_short and rungs:
+                    print(f"Budget of {budget_seconds}s spent during rung {rung}; keeping rung {rung - 1}")
+                    break
+                scores = [float(np.mean([known[(json.dumps(p, sort_keys=True), n_rows, fold)]["score"]
+                                         for fold in range(cv)])) for p in scored]
+                order = np.argsort(scores)[::-1]
+                fits = min(len(jobs), batch) if cut_short else len(jobs)
+                rungs.append({"rows": n_rows, "candidates": [(scored[i], scores[i]) for i in order],
+                              "fits": fits, "reused": len(scored) * cv - fits})
+                print(f"Rung {rung}: {len(scored)} candidates on {n_rows:,} rows, best AUC {scores[order[0]]:.4f}"
+                      f" ({fits} fits, {rungs[-1]['reused']} reused)")
+                if cut_short:
+                    print(f"Budget of {budget_seconds}s spent during rung {rung}")
+                    break
+
+                survivors = [scored[i] for i in order[:max(1, len(scored) // eta)]]
+                resource *= eta
+
+    best_params, best_score = rungs[-1]["candidates"][0]
+    result = {"best_params": best_params, "best_score": best_score, "rungs": rungs,
+              "seconds": time.perf_counter() - start}
+    refit_params = dict(best_params)
+    if early_stopping_rounds:
+        n_trees = [known[(json.dumps(best_params, sort_keys=True), rungs[-1]["rows"], fold)]["n_trees"]
+                   for fold in range(cv)]
+        refit_params["n_estimators"] = result["best_n_estimators"] = int(round(np.mean(n_trees)))
+    if refit:
+        # The refit has no stopping split; it trains the number of trees early stopping chose
+        result["best_estimator"] = make_estimator(model, refit_params, fraud_ratio).fit(X, y)
+    return result
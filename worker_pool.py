@@ -0,0 +1,204 @@
+"""Pre-fork multi-worker hosting of the scoring service.
+
+The parent process loads the model once, binds the listening socket and
+forks N workers. Each worker runs scoring_service's handler and
+micro-batcher on the inherited socket, so the kernel's accept queue is
+the common dispatcher and every core gets its own Python interpreter.
+
+The model is shared, not copied: workers are forked after the load, so
+the booster's trees and the numpy arrays (memory-mapped by joblib, or
+the compiled .npz with --compiled) are the parent's pages, copied only
+if written. gc.freeze() moves the loaded objects out of the garbage
+collector's reach, so collections in the workers don't touch (and copy)
+their pages either. An extra worker costs its own unique memory (USS),
+typically 5-15 MB of interpreter and request state.
+
+Each worker publishes its pid, request count, RSS and USS to a
+shared array every second; GET /workers on any worker returns all of
+them. Workers that die are restarted by the parent.
+
+Usage:
+    python worker_pool.py --workers 4 --port 8000 [--compiled]
+    FRAUD_SCORING_URL=http://localhost:8000 streamlit run app.py   # app.py scores through the pool
+"""
+
+import argparse
+import gc
+import os
+import signal
+import threading
+import time
+from multiprocessing import get_context
+
+from model_loader import load_compiled_model, load_model
+from scoring_service import ScoringHandler, ScoringServer, ScoringService
+
+STAT_FIELDS = ["pid", "requests", "rss_mb", "uss_mb", "started"]
+
+
+class WorkerStats:
+    """One row of STAT_FIELDS per worker in shared memory; each worker writes only its own row."""
+
+    def __init__(self, n_workers):
+        self.n_workers = n_workers
+        self._values = get_context("fork").Array("d", n_workers * len(STAT_FIELDS), lock=False)
+
+    def publish(self, worker, **values):
+        for name, value in values.items():
+            self._values[worker * len(STAT_FIELDS) + STAT_FIELDS.index(name)] = value
+
+    def snapshot(self):
+        rows = []
+        for worker in range(self.n_workers):
+            row = dict(zip(STAT_FIELDS, self._values[worker * len(STAT_FIELDS):(worker + 1) * len(STAT_FIELDS)]))
+            row.update(worker=worker, pid=int(row["pid"]), requests=int(row["requests"]))
+            rows.append(row)
+        return rows
+
+
+class PoolHandler(ScoringHandler):
+    stats = None  # set per worker
+    counters = None
+
+    def do_GET(self):
+        if self.path == "/workers":
+            self._send_json(200, {"workers": self.stats.snapshot()})
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        super().do_POST()
+        self.counters.record_request()
+
+
+class RequestCounters:
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+
+def _report(stats, index, counters, interval=1.0):
+    import psutil
+
+    process = psutil.Process()
+    started = time.time()
+    while True:
+        memory = process.memory_full_info()
+        stats.publish(index, pid=os.getpid(), requests=counters.requests, rss_mb=memory.rss / 1e6,
+                      uss_mb=memory.uss / 1e6, started=started)
+        time.sleep(interval)
+
+
+def _limit_threads(model):
+    """One compute thread per worker process; the processes already use every core."""
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(1)
+    model = getattr(model, "full_model", model)  # cascade.CascadeModel
+    if hasattr(model, "estimators_"):
+        from resampling import unwrap_estimator
+
+        for estimator in model.estimators_:
+            estimator = unwrap_estimator(estimator)
+            if "n_jobs" in estimator.get_params():
+                estimator.set_params(n_jobs=1)
+
+
+def _worker_main(index, server, model, stats, explain, service_options):
+    # Runs in the forked child: threads are only started here, never in the parent
+    from alerts import from_env
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl-C and stops the workers
+    explainer = None
+    if explain:
+        from explanations import Explainer
+
+        explainer = Explainer(model, top_k=explain, threshold=service_options.get("threshold", 0.5))
+    service = ScoringService(model, explainer=explainer, alerts=from_env(), **service_options)
+    counters = RequestCounters()
+    server.RequestHandlerClass = type("WorkerHandler", (PoolHandler,),
+                                      {"service": service, "stats": stats, "counters": counters})
+    threading.Thread(target=_report, args=(stats, index, counters), daemon=True).start()
+    server.serve_forever()
+
+
+def serve(host="0.0.0.0", port=8000, processes=None, model_path=None, compiled=False, explain=0,
+          **service_options):
+    """Load the model, fork `processes` workers serving on one socket and keep them running.
+
+    service_options go to each worker's ScoringService (its `workers` are micro-batch threads).
+    Velocity features are per-card state that a single process must own, so they are not
+    offered here; run scoring_service.py --velocity for that.
+    """
+    if explain and compiled:
+        raise ValueError("--explain needs the XGBoost trees; it can't be combined with --compiled")
+    processes = processes or os.cpu_count()
+    model = load_compiled_model(model_path) if compiled else load_model(model_path)
+    server = ScoringServer((host, port), ScoringHandler)
+    stats = WorkerStats(processes)
+    # Done before forking so the workers inherit the limits and share whatever this imported
+    _limit_threads(model)
+    # Everything allocated so far is shared with the workers; keep the collector off those pages
+    gc.collect()
+    gc.freeze()
+
+    context = get_context("fork")
+
+    def start(index):
+        process = context.Process(target=_worker_main, args=(index, server, model, stats, explain, service_options),
+                                  daemon=True)
+        process.start()
+        return process
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    children = [start(index) for index in range(processes)]
+    # Platforms stop dynos and containers with SIGTERM; shut the workers down the same way as Ctrl-C
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Serving on http://{host}:{port} with {processes} workers (pids {[p.pid for p in children]})")
+    try:
+        while True:
+            time.sleep(1)
+            for index, child in enumerate(children):
+                if not child.is_alive():
+                    print(f"Worker {index} (pid {child.pid}) exited with {child.exitcode}; restarting")
+                    children[index] = start(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.join()
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the fraud detection model from N forked workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--model", default=None, help="Path to the saved model (default: $FRAUD_MODEL_PATH)")
+    parser.add_argument("--compiled", action="store_true", help="Use the NumPy-only model from compiled_model.py")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="Most rows scored in one micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="Longest a row waits for its micro-batch")
+    parser.add_argument("--threads", type=int, default=1, help="Micro-batch scoring threads per worker")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Score above which a transaction is flagged")
+    parser.add_argument("--explain", type=int, default=0, metavar="K",
+                        help="Return the top K reasons for flagged transactions")
+    args = parser.parse_args(argv)
+
+    serve(args.host, args.port, args.workers, args.model, args.compiled, args.explain,
+          max_batch_size=args.max_batch_size, max_wait=args.max_wait_ms / 1000, workers=args.threads,
+          threshold=args.threshold)
+
+
+if __name__ == "__main__":
+    main()